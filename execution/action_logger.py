@@ -1,25 +1,67 @@
 
+import atexit
+import threading
+from datetime import datetime, timezone
 from execution.supabase_db import supabase
 
+# Actions are buffered and written to history_logs with one insert per flush,
+# the same way chat messages are: when the buffer fills, LOG_FLUSH_INTERVAL
+# seconds after the first queued entry, before the history is read, and at
+# interpreter exit. Callers never wait on the database.
+LOG_FLUSH_SIZE = 50
+LOG_FLUSH_INTERVAL = 0.5  # seconds
+
+_log_buffer = []
+_log_lock = threading.Lock()        # Guards _log_buffer and _log_flush_timer
+_log_flush_lock = threading.Lock()  # One insert at a time so batches land in order
+_log_flush_timer = None
+
 def log_action(action_type, description, details=None):
     """
-    Log an action to the history_logs table.
-    
+    Queue an action for the history_logs table.
+
     Args:
         action_type (str): Category of action (e.g., 'CREATE_GOAL', 'COMPLETE_TASK')
         description (str): Human-readable summary
         details (dict, optional): proper structured data for the action
     """
-    try:
-        data = {
-            "action_type": action_type,
-            "description": description,
-            "details": details or {}
-        }
-        # created_at is handled by default value in schema
-        supabase.table("history_logs").insert(data).execute()
-        return True
-    except Exception as e:
-        # We don't want logging failures to crash the main app
-        print(f"⚠️ Failed to log action: {e}")
-        return False
+    global _log_flush_timer
+    data = {
+        "action_type": action_type,
+        "description": description,
+        "details": details or {},
+        # Stamped here so entries batched into one insert keep their order
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    with _log_lock:
+        _log_buffer.append(data)
+        flush_now = len(_log_buffer) >= LOG_FLUSH_SIZE
+        if not flush_now and _log_flush_timer is None:
+            _log_flush_timer = threading.Timer(LOG_FLUSH_INTERVAL, flush_action_logs)
+            _log_flush_timer.daemon = True
+            _log_flush_timer.start()
+
+    if flush_now:
+        flush_action_logs()
+    return True
+
+def flush_action_logs():
+    """Write all buffered actions in a single insert."""
+    global _log_flush_timer
+    with _log_flush_lock:
+        with _log_lock:
+            batch = _log_buffer[:]
+            _log_buffer.clear()
+            if _log_flush_timer is not None:
+                _log_flush_timer.cancel()
+                _log_flush_timer = None
+
+        if not batch:
+            return
+        try:
+            supabase.table("history_logs").insert(batch).execute()
+        except Exception as e:
+            # We don't want logging failures to crash the main app
+            print(f"⚠️ Failed to log {len(batch)} action(s): {e}")
+
+atexit.register(flush_action_logs)
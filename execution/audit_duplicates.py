@@ -10,7 +10,7 @@ supabase: Client = create_client(url, key)
 
 def audit():
     print("🔍 Auditing Knowledge Base for duplicates...")
-    response = supabase.table("knowledge_base").select("*").execute()
+    response = supabase.table("knowledge_base").select("id, title, content, category").execute()
     data = response.data
     
     seen = {} # (title, content) -> list of IDs
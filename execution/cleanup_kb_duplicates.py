@@ -8,9 +8,12 @@ url = os.getenv("SUPABASE_URL")
 key = os.getenv("SUPABASE_KEY")
 supabase: Client = create_client(url, key)
 
+# Max IDs per DELETE request (keeps the URL filter a reasonable size)
+DELETE_BATCH_SIZE = 100
+
 def audit_and_cleanup():
     print("🔍 Auditing Knowledge Base for duplicates...")
-    response = supabase.table("knowledge_base").select("*").execute()
+    response = supabase.table("knowledge_base").select("id, title, content").execute()
     data = response.data
     
     seen = {} # (title, content) -> list of IDs
@@ -32,9 +35,12 @@ def audit_and_cleanup():
         print("✅ No duplicates found.")
     else:
         print(f"\n🗑️ Deleting {len(to_delete)} duplicate entries...")
-        for entry_id in to_delete:
-            res = supabase.table("knowledge_base").delete().eq("id", entry_id).execute()
-            print(f"   - Deleted ID: {entry_id}")
+        # One DELETE ... WHERE id IN (...) per batch instead of one request per row
+        for start in range(0, len(to_delete), DELETE_BATCH_SIZE):
+            batch = to_delete[start:start + DELETE_BATCH_SIZE]
+            supabase.table("knowledge_base").delete().in_("id", batch).execute()
+            for entry_id in batch:
+                print(f"   - Deleted ID: {entry_id}")
             
     print("\n✨ Audit and cleanup complete.")
 
@@ -11,14 +11,14 @@ if current_dir not in sys.path:
     sys.path.append(current_dir)
 
 try:
-    from execution.llm_utils import LLMClient
+    from execution.llm_utils import get_llm_client
     from execution.supabase_db import create_goal as db_create_goal, create_tasks as db_create_tasks
 except ImportError:
     try:
-        from llm_utils import LLMClient
+        from llm_utils import get_llm_client
         from supabase_db import create_goal as db_create_goal, create_tasks as db_create_tasks
     except ImportError:
-        LLMClient = None
+        get_llm_client = None
 
 # Load environment variables
 load_dotenv()
@@ -41,10 +41,10 @@ def parse_due_date(date_str):
 
 def generate_breakdown(name, description, due_date):
     """Generate sub-tasks using LLM."""
-    if not LLMClient:
+    if not get_llm_client:
         return []
     try:
-        client = LLMClient()
+        client = get_llm_client()
         prompt = f"""
         ฉันมีเป้าหมาย: "{name}"
         รายละเอียด: {description}
@@ -43,7 +43,13 @@ SCOPES = [
     'https://www.googleapis.com/auth/calendar.events'
 ]
 DEFAULT_SHEET_ID = '194ZhTkYYog4qHGALr0qSYuX4iXvuypELRKoVz_--3DA'
-USER_ID_FILE = 'user_ids.json'
+
+SHEETS_NUM_RETRIES = 3  # googleapiclient retries 429/5xx with backoff
+
+USER_ID_FILE = 'user_ids.txt'
+
+# "Every X days/hours" reminder schedules (matched against lowercased text)
+EVERY_INTERVAL_RE = re.compile(r'every\s+(\d+)\s+(day|hour|วัน|ชั่วโมง)')
 
 def get_credentials():
     """Get or refresh Google API credentials."""
@@ -148,7 +154,7 @@ def parse_reminder_schedule(schedule_str):
         return 168  # 7 days in hours
     
     # "Every X days/hours" patterns
-    match = re.search(r'every\s+(\d+)\s+(day|hour|วัน|ชั่วโมง)', schedule_lower)
+    match = EVERY_INTERVAL_RE.search(schedule_lower)
     if match:
         number = int(match.group(1))
         unit = match.group(2)
@@ -160,13 +166,14 @@ def parse_reminder_schedule(schedule_str):
     # Default to daily if has any schedule
     return 24
 
-def should_remind(last_reminded_str, reminder_schedule):
+def should_remind(last_reminded_str, reminder_schedule, now=None):
     """
     Determine if a reminder should be sent now.
     
     Args:
         last_reminded_str: Last reminded timestamp (YYYY-MM-DD HH:MM:SS) or empty
         reminder_schedule: Reminder schedule string
+        now: Reference time (defaults to datetime.now())
         
     Returns:
         Boolean indicating if reminder is due
@@ -184,7 +191,7 @@ def should_remind(last_reminded_str, reminder_schedule):
     
     try:
         last_reminded = datetime.strptime(last_reminded_str, '%Y-%m-%d %H:%M:%S')
-        time_since = datetime.now() - last_reminded
+        time_since = (now or datetime.now()) - last_reminded
         hours_since = time_since.total_seconds() / 3600
         
         return hours_since >= hours_interval
@@ -212,7 +219,7 @@ def check_reminders(update_timestamps=False):
         result = sheets_service.spreadsheets().values().get(
             spreadsheetId=sheet_id,
             range="Goals!A:M"
-        ).execute()
+        ).execute(num_retries=SHEETS_NUM_RETRIES)
         
         values = result.get('values', [])
         
@@ -224,6 +231,10 @@ def check_reminders(update_timestamps=False):
         reminders = []
         updates = []
         
+        # One reference time for the whole run
+        now = datetime.now()
+        now_str = now.strftime('%Y-%m-%d %H:%M:%S')
+        
         # Check each goal
         for i, row in enumerate(values[1:], start=2):
             if not row or len(row) < 9:
@@ -249,13 +260,13 @@ def check_reminders(update_timestamps=False):
                 continue
             
             # Check if reminder is due
-            if should_remind(last_reminded, reminder_schedule):
+            if should_remind(last_reminded, reminder_schedule, now):
                 # Calculate days until due
                 days_left = None
                 if due_date:
                     try:
                         due_dt = datetime.strptime(due_date, '%Y-%m-%d')
-                        days_left = (due_dt - datetime.now()).days
+                        days_left = (due_dt - now).days
                     except:
                         pass
                 
@@ -276,10 +287,9 @@ def check_reminders(update_timestamps=False):
                 
                 # Prepare timestamp update
                 if update_timestamps:
-                    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                     updates.append({
                         'range': f"Goals!J{i}",  # Column J = Last Reminded
-                        'values': [[now]]
+                        'values': [[now_str]]
                     })
         
         # Update timestamps if requested
@@ -293,7 +303,7 @@ def check_reminders(update_timestamps=False):
                 sheets_service.spreadsheets().values().batchUpdate(
                     spreadsheetId=sheet_id,
                     body=body
-                ).execute()
+                ).execute(num_retries=SHEETS_NUM_RETRIES)
                 
                 print(f"✓ Updated {len(updates)} reminder timestamp(s)\n")
             except HttpError as error:
@@ -356,7 +366,7 @@ def check_reminders(update_timestamps=False):
                 send_email_via_api(
                     gmail_service, 
                     user_email, 
-                    f"NOVA II Daily Briefing - {datetime.now().strftime('%Y-%m-%d')}",
+                    f"NOVA II Daily Briefing - {now.strftime('%Y-%m-%d')}",
                     email_body
                 )
             else:
@@ -38,6 +38,8 @@ load_dotenv()
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 DEFAULT_SHEET_ID = '194ZhTkYYog4qHGALr0qSYuX4iXvuypELRKoVz_--3DA'
 
+SHEETS_NUM_RETRIES = 3  # googleapiclient retries 429/5xx with backoff
+
 def get_credentials():
     """Get or refresh Google API credentials."""
     creds = None
@@ -75,7 +77,7 @@ def find_goal(service, spreadsheet_id, identifier):
         result = service.spreadsheets().values().get(
             spreadsheetId=spreadsheet_id,
             range="Goals!A:M"
-        ).execute()
+        ).execute(num_retries=SHEETS_NUM_RETRIES)
         
         values = result.get('values', [])
         
@@ -214,7 +216,7 @@ def update_goal(identifier, status=None, notes=None, priority=None, due_date=Non
         service.spreadsheets().values().batchUpdate(
             spreadsheetId=sheet_id,
             body=body
-        ).execute()
+        ).execute(num_retries=SHEETS_NUM_RETRIES)
         
         print("✅ Goal updated successfully!\n")
         print(f"{'='*50}")
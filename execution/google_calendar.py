@@ -17,6 +17,8 @@ import argparse
 import json
 import pickle
 import base64
+import re
+import threading
 from datetime import datetime, timedelta
 
 from dotenv import load_dotenv
@@ -39,6 +41,9 @@ SCOPES = [
 # Timezone for Bangkok
 TIMEZONE = 'Asia/Bangkok'
 
+# Digits in free-form Thai/English times like 'บ่าย 3' or '9am'
+DIGITS_RE = re.compile(r'\d+')
+
 
 def get_credentials():
     """Get or refresh Google API credentials.
@@ -101,12 +106,23 @@ def get_credentials():
     return creds
 
 
+# One Calendar service per thread: credential loading and build() run once per
+# worker instead of on every call, and the underlying httplib2.Http (not
+# thread-safe) is never shared between the bot's worker threads.
+_thread_local = threading.local()
+
+
 def get_calendar_service():
-    """Get authenticated Google Calendar service."""
-    creds = get_credentials()
-    if not creds:
-        return None
-    return build('calendar', 'v3', credentials=creds)
+    """Get authenticated Google Calendar service (cached per thread)."""
+    service = getattr(_thread_local, 'calendar_service', None)
+    if service is None:
+        creds = get_credentials()
+        if not creds:
+            return None
+        # The authorized http refreshes expired tokens itself
+        service = build('calendar', 'v3', credentials=creds)
+        _thread_local.calendar_service = service
+    return service
 
 
 def list_events(days=7, max_results=20):
@@ -134,7 +150,8 @@ def list_events(days=7, max_results=20):
             timeMax=time_max,
             maxResults=max_results,
             singleEvents=True,
-            orderBy='startTime'
+            orderBy='startTime',
+            fields='items(id,summary,start,end,location,description)'
         ).execute()
 
         events = events_result.get('items', [])
@@ -207,7 +224,8 @@ def create_event(summary, start_time, end_time, description=None,
     try:
         event = service.events().insert(
             calendarId='primary',
-            body=event_body
+            body=event_body,
+            fields='id,summary,start,end,htmlLink'
         ).execute()
 
         return {
@@ -274,7 +292,8 @@ def find_event_by_name(name, days=30):
             timeMax=time_max,
             q=name,  # Google Calendar search query
             singleEvents=True,
-            orderBy='startTime'
+            orderBy='startTime',
+            fields='items(id,summary,start,end)'
         ).execute()
 
         events = events_result.get('items', [])
@@ -383,15 +402,13 @@ def parse_datetime_thai(date_str, time_str=None):
         hour = int(parts[0])
         minute = int(parts[1]) if len(parts) > 1 else 0
     elif 'บ่าย' in time_str or 'pm' in time_str.lower():
-        import re
-        nums = re.findall(r'\d+', time_str)
+        nums = DIGITS_RE.findall(time_str)
         if nums:
             hour = int(nums[0])
             if hour < 12:
                 hour += 12
     elif 'เช้า' in time_str or 'am' in time_str.lower():
-        import re
-        nums = re.findall(r'\d+', time_str)
+        nums = DIGITS_RE.findall(time_str)
         if nums:
             hour = int(nums[0])
 
@@ -17,7 +17,10 @@ Examples:
 import os
 import sys
 import argparse
+import functools
+import heapq
 import re
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -26,17 +29,56 @@ from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import pickle
 
+# Optional C-level multi-pattern matcher (pip install pyahocorasick)
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 # Load environment variables
 load_dotenv()
 
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 DEFAULT_SHEET_ID = '194ZhTkYYog4qHGALr0qSYuX4iXvuypELRKoVz_--3DA'
 
+SHEETS_NUM_RETRIES = 3  # googleapiclient retries 429/5xx with backoff
+
 # Knowledge sheets to search
 KNOWLEDGE_SHEETS = ['Notes', 'Lessons Learned', 'Business', 'Customers', 'Other']
 
+# (label, column header) pairs shown for each sheet type
+DISPLAY_FIELDS = {
+    'Notes': [
+        ('ID', 'Note ID'), ('Title', 'Title'), ('Content', 'Content'),
+        ('Category', 'Category'), ('Tags', 'Tags'), ('Created', 'Created Date'),
+    ],
+    'Lessons Learned': [
+        ('ID', 'Lesson ID'), ('Title', 'Title'), ('What Happened', 'What Happened'),
+        ('What I Learned', 'What I Learned'), ('How to Apply', 'How to Apply'),
+        ('Category', 'Category'),
+    ],
+    'Business': [
+        ('ID', 'Entry ID'), ('Topic', 'Topic'), ('Content', 'Content'),
+        ('Category', 'Category'), ('Tags', 'Tags'),
+    ],
+    'Customers': [
+        ('ID', 'Contact ID'), ('Name', 'Name'), ('Type', 'Type'),
+        ('Company', 'Company'), ('Notes', 'Notes'), ('Last Contact', 'Last Contact'),
+    ],
+    'Other': [
+        ('ID', 'Entry ID'), ('Title', 'Title'), ('Content', 'Content'),
+        ('Category', 'Category'),
+    ],
+}
+
+@functools.lru_cache(maxsize=1)
 def get_credentials():
-    """Get or refresh Google API credentials."""
+    """
+    Get or refresh Google API credentials.
+    
+    Cached per process so token.pickle is only read once; the google-auth
+    transport refreshes the cached credentials when they expire.
+    """
     creds = None
     
     if os.path.exists('token.pickle'):
@@ -61,76 +103,155 @@ def get_credentials():
     
     return creds
 
-def search_in_sheet(service, spreadsheet_id, sheet_name, query_terms):
+class RowView:
     """
-    Search for query terms in a specific sheet.
+    Read-only, dict-like view of a sheet row keyed by header name.
+    
+    Indexes into the original row on demand instead of copying every
+    column into a new dict for each match.
+    """
+    __slots__ = ('_index', '_row')
+    
+    def __init__(self, index, row):
+        self._index = index  # {header: column position}, shared per sheet
+        self._row = row
+    
+    def __getitem__(self, key):
+        i = self._index[key]
+        return self._row[i] if i < len(self._row) else ''
+    
+    def get(self, key, default=''):
+        if key not in self._index:
+            return default
+        return self[key]
+
+def build_term_matcher(query_terms):
+    """
+    Build an Aho-Corasick automaton over the query terms.
+    
+    One automaton scan finds every term in a single pass over the row text,
+    instead of one `count()` pass per term. Only worth it for 3+ terms, and
+    only when pyahocorasick is installed; returns None otherwise.
+    
+    Expects deduplicated terms (see retrieve_knowledge), so both scoring
+    paths see the same term list.
+    """
+    if ahocorasick is None or len(query_terms) < 3:
+        return None
+    
+    automaton = ahocorasick.Automaton()
+    for term in query_terms:
+        automaton.add_word(term, term)
+    automaton.make_automaton()
+    return automaton
+
+def score_rows(sheet_name, values, query_terms, matcher=None):
+    """
+    Score the rows of one sheet against the query terms.
     
     Args:
-        service: Google Sheets API service
-        spreadsheet_id: ID of the spreadsheet
-        sheet_name: Name of the sheet to search
+        sheet_name: Name of the sheet the values came from
+        values: Sheet values (header row first) as returned by the Sheets API
         query_terms: List of search terms (lowercase)
+        matcher: Optional automaton from build_term_matcher()
         
     Returns:
         List of matching rows with relevance scores
     """
-    try:
-        # Get all data from sheet
-        result = service.spreadsheets().values().get(
-            spreadsheetId=spreadsheet_id,
-            range=f"{sheet_name}!A:Z"
-        ).execute()
-        
-        values = result.get('values', [])
+    if len(values) <= 1:  # Only header or empty
+        return []
+    
+    headers = values[0]
+    header_index = {header: j for j, header in enumerate(headers)}
+    matches = []
+    
+    # Search through each row
+    for i, row in enumerate(values[1:], start=2):  # Skip header
+        if not row:
+            continue
         
-        if len(values) <= 1:  # Only header or empty
-            return []
+        # Convert row to searchable text
+        row_text = ' '.join(str(cell) for cell in row).lower()
         
-        headers = values[0]
-        matches = []
+        # Calculate relevance score
+        score = 0
+        matched_terms = []
         
-        # Search through each row
-        for i, row in enumerate(values[1:], start=2):  # Skip header
-            if not row:
-                continue
-            
-            # Convert row to searchable text
-            row_text = ' '.join(str(cell) for cell in row).lower()
-            
-            # Calculate relevance score
-            score = 0
-            matched_terms = []
-            
+        if matcher is not None:
+            # Single pass. iter() reports overlapping hits too, so keep only
+            # those starting past the term's previous hit: the same
+            # non-overlapping count that str.count() gives below
+            last_end = {}
+            for end, term in matcher.iter(row_text):
+                if end - len(term) >= last_end.get(term, -1):
+                    score += 1
+                    last_end[term] = end
+            matched_terms = [term for term in query_terms if term in last_end]
+        else:
             for term in query_terms:
                 if term in row_text:
                     # Count occurrences for scoring
                     count = row_text.count(term)
                     score += count
                     matched_terms.append(term)
-            
-            if score > 0:
-                # Create result dict
-                result_dict = {}
-                for j, header in enumerate(headers):
-                    if j < len(row):
-                        result_dict[header] = row[j]
-                    else:
-                        result_dict[header] = ''
-                
-                matches.append({
-                    'sheet': sheet_name,
-                    'row_number': i,
-                    'score': score,
-                    'matched_terms': matched_terms,
-                    'data': result_dict
-                })
         
-        return matches
+        if score > 0:
+            matches.append({
+                'sheet': sheet_name,
+                'row_number': i,
+                'score': score,
+                'matched_terms': matched_terms,
+                'data': RowView(header_index, row)
+            })
+    
+    return matches
+
+def search_in_sheet(service, spreadsheet_id, sheet_name, query_terms, matcher=None):
+    """
+    Search for query terms in a specific sheet.
+    
+    Args:
+        service: Google Sheets API service
+        spreadsheet_id: ID of the spreadsheet
+        sheet_name: Name of the sheet to search
+        query_terms: List of search terms (lowercase)
+        matcher: Optional automaton from build_term_matcher()
+        
+    Returns:
+        List of matching rows with relevance scores
+    """
+    try:
+        # Get all data from sheet
+        result = service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id,
+            range=f"{sheet_name}!A:Z"
+        ).execute(num_retries=SHEETS_NUM_RETRIES)
+        
+        return score_rows(sheet_name, result.get('values', []), query_terms, matcher)
         
     except HttpError as error:
         print(f"Warning: Could not search sheet '{sheet_name}': {error}")
         return []
 
+def fetch_all_ranges(service, spreadsheet_id, sheet_names):
+    """
+    Fetch A:Z of several sheets in a single values.batchGet round trip.
+    
+    Returns:
+        Dict of sheet name -> values (header row first)
+    """
+    result = service.spreadsheets().values().batchGet(
+        spreadsheetId=spreadsheet_id,
+        ranges=[f"'{name}'!A:Z" for name in sheet_names]
+    ).execute(num_retries=SHEETS_NUM_RETRIES)
+    
+    # valueRanges come back in the same order as the requested ranges
+    value_ranges = result.get('valueRanges', [])
+    return {
+        name: value_range.get('values', [])
+        for name, value_range in zip(sheet_names, value_ranges)
+    }
+
 def retrieve_knowledge(query, target_sheet=None, limit=10):
     """
     Search and retrieve knowledge items.
@@ -145,34 +266,50 @@ def retrieve_knowledge(query, target_sheet=None, limit=10):
     """
     print(f"🔍 Searching for: '{query}'\n")
     
-    # Get credentials and create service
+    # Get credentials
     creds = get_credentials()
-    service = build('sheets', 'v4', credentials=creds)
     
     # Get Sheet ID
     sheet_id = os.getenv('GOOGLE_SHEET_ID', DEFAULT_SHEET_ID)
     
-    # Prepare search terms (split query into words, lowercase)
-    query_terms = [term.lower() for term in re.findall(r'\w+', query)]
+    # Prepare search terms (split query into words, lowercase, each word once)
+    query_terms = list(dict.fromkeys(term.lower() for term in re.findall(r'\w+', query)))
+    matcher = build_term_matcher(query_terms)
     
     # Determine which sheets to search
     sheets_to_search = [target_sheet] if target_sheet else KNOWLEDGE_SHEETS
+    sheets_to_search = [name for name in sheets_to_search if name in KNOWLEDGE_SHEETS]
     
     # Search across sheets
     all_matches = []
     
-    for sheet_name in sheets_to_search:
-        if sheet_name not in KNOWLEDGE_SHEETS:
-            continue
-        
-        matches = search_in_sheet(service, sheet_id, sheet_name, query_terms)
-        all_matches.extend(matches)
+    def search_task(sheet_name):
+        # googleapiclient services are not thread-safe, so one per worker
+        service = build('sheets', 'v4', credentials=creds)
+        return search_in_sheet(service, sheet_id, sheet_name, query_terms, matcher)
     
-    # Sort by relevance score
-    all_matches.sort(key=lambda x: x['score'], reverse=True)
+    if sheets_to_search:
+        try:
+            # One round trip for every sheet instead of one per sheet
+            service = build('sheets', 'v4', credentials=creds)
+            sheet_values = fetch_all_ranges(service, sheet_id, sheets_to_search)
+            for sheet_name in sheets_to_search:
+                all_matches.extend(
+                    score_rows(sheet_name, sheet_values.get(sheet_name, []), query_terms, matcher)
+                )
+        except HttpError as error:
+            # batchGet fails as a whole if any range is bad (e.g. a missing sheet);
+            # fall back to concurrent per-sheet reads so the other sheets still work.
+            # map() keeps results in sheet order so ties sort the same as before.
+            print(f"Warning: Batch read failed, searching sheets one by one: {error}")
+            all_matches = []
+            with ThreadPoolExecutor(max_workers=len(sheets_to_search)) as executor:
+                for matches in executor.map(search_task, sheets_to_search):
+                    all_matches.extend(matches)
     
-    # Limit results
-    results = all_matches[:limit]
+    # Top `limit` by relevance score: O(N log limit) instead of a full sort.
+    # nlargest is stable, so ties keep sheet/row order as the old sort did.
+    results = heapq.nlargest(limit, all_matches, key=lambda x: x['score'])
     
     # Display results
     if not results:
@@ -181,53 +318,24 @@ def retrieve_knowledge(query, target_sheet=None, limit=10):
     
     print(f"✅ Found {len(results)} result(s):\n")
     
+    # Build the whole report and write it once instead of ~10 print() calls per result
+    lines = []
     for i, match in enumerate(results, 1):
-        print(f"{'='*60}")
-        print(f"Result #{i} (Score: {match['score']})")
-        print(f"Sheet: {match['sheet']}")
-        print(f"{'='*60}")
+        lines.append('='*60)
+        lines.append(f"Result #{i} (Score: {match['score']})")
+        lines.append(f"Sheet: {match['sheet']}")
+        lines.append('='*60)
         
         data = match['data']
         
         # Display based on sheet type
-        if match['sheet'] == 'Notes':
-            print(f"ID: {data.get('Note ID', '')}")
-            print(f"Title: {data.get('Title', '')}")
-            print(f"Content: {data.get('Content', '')}")
-            print(f"Category: {data.get('Category', '')}")
-            print(f"Tags: {data.get('Tags', '')}")
-            print(f"Created: {data.get('Created Date', '')}")
-            
-        elif match['sheet'] == 'Lessons Learned':
-            print(f"ID: {data.get('Lesson ID', '')}")
-            print(f"Title: {data.get('Title', '')}")
-            print(f"What Happened: {data.get('What Happened', '')}")
-            print(f"What I Learned: {data.get('What I Learned', '')}")
-            print(f"How to Apply: {data.get('How to Apply', '')}")
-            print(f"Category: {data.get('Category', '')}")
-            
-        elif match['sheet'] == 'Business':
-            print(f"ID: {data.get('Entry ID', '')}")
-            print(f"Topic: {data.get('Topic', '')}")
-            print(f"Content: {data.get('Content', '')}")
-            print(f"Category: {data.get('Category', '')}")
-            print(f"Tags: {data.get('Tags', '')}")
-            
-        elif match['sheet'] == 'Customers':
-            print(f"ID: {data.get('Contact ID', '')}")
-            print(f"Name: {data.get('Name', '')}")
-            print(f"Type: {data.get('Type', '')}")
-            print(f"Company: {data.get('Company', '')}")
-            print(f"Notes: {data.get('Notes', '')}")
-            print(f"Last Contact: {data.get('Last Contact', '')}")
-            
-        else:  # Other
-            print(f"ID: {data.get('Entry ID', '')}")
-            print(f"Title: {data.get('Title', '')}")
-            print(f"Content: {data.get('Content', '')}")
-            print(f"Category: {data.get('Category', '')}")
+        fields = DISPLAY_FIELDS.get(match['sheet'], DISPLAY_FIELDS['Other'])
+        for label, header in fields:
+            lines.append(f"{label}: {data.get(header, '')}")
         
-        print()
+        lines.append('')
+    
+    sys.stdout.write("\n".join(lines) + "\n")
     
     return results
 
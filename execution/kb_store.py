@@ -16,6 +16,7 @@ Examples:
 import os
 import sys
 import argparse
+import functools
 from datetime import datetime
 from dotenv import load_dotenv
 from google.oauth2.credentials import Credentials
@@ -32,6 +33,8 @@ load_dotenv()
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 DEFAULT_SHEET_ID = '194ZhTkYYog4qHGALr0qSYuX4iXvuypELRKoVz_--3DA'
 
+SHEETS_NUM_RETRIES = 3  # googleapiclient retries 429/5xx with backoff
+
 # Category mapping
 CATEGORY_MAP = {
     'notes': 'Notes',
@@ -52,8 +55,14 @@ CATEGORY_MAP = {
     'อื่นๆ': 'Other'
 }
 
+@functools.lru_cache(maxsize=1)
 def get_credentials():
-    """Get or refresh Google API credentials."""
+    """
+    Get or refresh Google API credentials.
+    
+    Cached per process so token.pickle is only read once; the google-auth
+    transport refreshes the cached credentials when they expire.
+    """
     creds = None
     
     if os.path.exists('token.pickle'):
@@ -86,6 +95,10 @@ def normalize_category(category):
     category_lower = category.lower().strip()
     return CATEGORY_MAP.get(category_lower, 'Other')
 
+# Row count per sheet: read once from the sheet, then advanced locally
+# after each successful append so later IDs skip the extra round trip
+_row_counts = {}
+
 def generate_id(sheet_name, service, spreadsheet_id):
     """Generate unique ID for the entry."""
     # Get prefix based on sheet
@@ -99,21 +112,21 @@ def generate_id(sheet_name, service, spreadsheet_id):
     
     prefix = prefixes.get(sheet_name, 'GEN')
     
-    # Get current row count to generate next ID
-    try:
-        result = service.spreadsheets().values().get(
-            spreadsheetId=spreadsheet_id,
-            range=f"{sheet_name}!A:A"
-        ).execute()
-        
-        values = result.get('values', [])
-        # Subtract 1 for header row
-        count = len(values)
-        next_id = f"{prefix}-{count:03d}"
-        
-        return next_id
-    except:
-        return f"{prefix}-001"
+    # Get current row count to generate next ID (fetched once per sheet)
+    if sheet_name not in _row_counts:
+        try:
+            result = service.spreadsheets().values().get(
+                spreadsheetId=spreadsheet_id,
+                range=f"{sheet_name}!A:A"
+            ).execute(num_retries=SHEETS_NUM_RETRIES)
+            
+            values = result.get('values', [])
+            # Includes the header row, so this is already the next number
+            _row_counts[sheet_name] = len(values)
+        except:
+            return f"{prefix}-001"
+    
+    return f"{prefix}-{_row_counts[sheet_name]:03d}"
 
 def store_knowledge(title, content, category=None, tags=None):
     """
@@ -184,6 +197,9 @@ def store_knowledge(title, content, category=None, tags=None):
             body=body
         ).execute()
         
+        if sheet_name in _row_counts:
+            _row_counts[sheet_name] += 1
+        
         print(f"\n✅ Stored successfully!")
         print(f"Sheet: {sheet_name}")
         print(f"ID: {entry_id}")
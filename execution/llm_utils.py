@@ -8,6 +8,7 @@ Handles interactions with OpenAI and Anthropic APIs.
 import os
 import sys
 import json
+import threading
 from enum import Enum
 from typing import Optional, Dict, Any, List, Union
 
@@ -27,6 +28,19 @@ try:
 except ImportError:
     Anthropic = None
 
+# Faster JSON parsing for LLM output (falls back to stdlib)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def parse_json(text: Union[str, bytes]) -> Any:
+    """Parse JSON with orjson when available, else stdlib json."""
+    if orjson is not None:
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError
+        return orjson.loads(text)
+    return json.loads(text)
+
 class LLMProvider(Enum):
     OPENAI = "openai"
     ANTHROPIC = "anthropic"
@@ -61,8 +75,9 @@ class LLMClient:
                      prompt: str, 
                      system_prompt: str = "You are a helpful AI assistant.",
                      provider: LLMProvider = LLMProvider.AUTO,
-                     model: str = None) -> Optional[str]:
-        """Generate text from LLM."""
+                     model: str = None,
+                     json_mode: bool = False) -> Optional[str]:
+        """Generate text from LLM. json_mode asks OpenAI for a JSON object response."""
         
         # Determine initial provider
         selected_provider = self._select_provider(provider)
@@ -73,10 +88,10 @@ class LLMClient:
             # Fallback to OpenAI if failed and AUTO was requested
             if result is None and provider == LLMProvider.AUTO and self.openai_client:
                 print("⚠️ Anthropic failed, falling back to OpenAI...")
-                result = self._generate_openai(prompt, system_prompt)
+                result = self._generate_openai(prompt, system_prompt, json_mode=json_mode)
                 
         elif selected_provider == LLMProvider.OPENAI:
-            result = self._generate_openai(prompt, system_prompt, model)
+            result = self._generate_openai(prompt, system_prompt, model, json_mode)
             # Fallback to Anthropic if failed and AUTO was requested
             if result is None and provider == LLMProvider.AUTO and self.anthropic_client:
                 print("⚠️ OpenAI failed, falling back to Anthropic...")
@@ -97,7 +112,8 @@ class LLMClient:
         # Force JSON instruction
         system_prompt += "\nIMPORTANT: Return ONLY valid JSON."
         
-        text = self.generate_text(prompt, system_prompt, provider, model)
+        # Callers expect a top-level object (intent routing, task breakdown)
+        text = self.generate_text(prompt, system_prompt, provider, model, json_mode=True)
         if not text:
             return None
             
@@ -112,7 +128,7 @@ class LLMClient:
         text = text.strip()
             
         try:
-            return json.loads(text)
+            return parse_json(text)
         except json.JSONDecodeError as e:
             print(f"Error parsing JSON: {e}")
             print(f"Raw output: {text}")
@@ -155,7 +171,7 @@ class LLMClient:
             print(f"Anthropic generation error: {e}")
             return None
 
-    def _generate_openai(self, prompt: str, system: str, model: str = None) -> Optional[str]:
+    def _generate_openai(self, prompt: str, system: str, model: str = None, json_mode: bool = False) -> Optional[str]:
         if not self.openai_client:
             return None
             
@@ -164,18 +180,40 @@ class LLMClient:
             model = model or os.getenv("OPENAI_MODEL", "gpt-4o")
             print(f"🤖 Using OpenAI ({model})...")
             
+            # JSON mode guarantees parseable output (no markdown fences or
+            # prose), so there's nothing to strip or retry
+            extra = {"response_format": {"type": "json_object"}} if json_mode else {}
             response = self.openai_client.chat.completions.create(
                 model=model,
                 messages=[
                     {"role": "system", "content": system},
                     {"role": "user", "content": prompt}
-                ]
+                ],
+                **extra
             )
             return response.choices[0].message.content
         except Exception as e:
             print(f"OpenAI generation error: {e}")
             return None
 
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+def get_llm_client() -> LLMClient:
+    """
+    Return a process-wide LLMClient, creating it on first use.
+    
+    The OpenAI/Anthropic SDK clients are thread-safe and keep their HTTP
+    connection pools, so reusing one instance avoids re-reading keys and
+    re-opening connections for every message.
+    """
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = LLMClient()
+    return _shared_client
+
 def main():
     """Test function."""
     client = LLMClient()
@@ -8,9 +8,12 @@ url = os.getenv("SUPABASE_URL")
 key = os.getenv("SUPABASE_KEY")
 supabase: Client = create_client(url, key)
 
+# Max IDs per DELETE request (keeps the URL filter a reasonable size)
+DELETE_BATCH_SIZE = 100
+
 def semantic_cleanup():
     print("🧹 Starting semantic cleanup of Knowledge Base...")
-    response = supabase.table("knowledge_base").select("*").execute()
+    response = supabase.table("knowledge_base").select("id, title, content").execute()
     data = response.data
     
     # Heuristic topics: (Keywords, Label)
@@ -48,9 +51,12 @@ def semantic_cleanup():
         print("✅ No related duplicates found.")
     else:
         print(f"\n🚀 Deleting {len(to_delete)} entries...")
-        for entry_id in to_delete:
-            res = supabase.table("knowledge_base").delete().eq("id", entry_id).execute()
-            print(f"   - Deleted ID: {entry_id}")
+        # One DELETE ... WHERE id IN (...) per batch instead of one request per row
+        for start in range(0, len(to_delete), DELETE_BATCH_SIZE):
+            batch = to_delete[start:start + DELETE_BATCH_SIZE]
+            supabase.table("knowledge_base").delete().in_("id", batch).execute()
+            for entry_id in batch:
+                print(f"   - Deleted ID: {entry_id}")
             
     print("\n✨ Semantic cleanup complete.")
 
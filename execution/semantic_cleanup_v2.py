@@ -11,6 +11,7 @@ Usage:
 
 import os
 import argparse
+from collections import Counter, defaultdict
 from supabase import create_client, Client
 from dotenv import load_dotenv
 from datetime import datetime
@@ -21,6 +22,9 @@ url = os.getenv("SUPABASE_URL")
 key = os.getenv("SUPABASE_KEY")
 supabase: Client = create_client(url, key)
 
+# Max IDs per DELETE request (keeps the URL filter a reasonable size)
+DELETE_BATCH_SIZE = 100
+
 def calculate_similarity(text1, text2):
     """
     Calculate simple similarity score between two texts.
@@ -43,40 +47,70 @@ def find_semantic_duplicates(threshold=0.7):
     """Find groups of semantically similar entries."""
     print(f"🔍 Scanning Knowledge Base for semantic duplicates (threshold: {threshold})...\n")
     
-    response = supabase.table("knowledge_base").select("*").order("created_at", desc=True).execute()
+    response = supabase.table("knowledge_base").select("id, title, content, category, created_at").order("created_at", desc=True).execute()
     data = response.data
     
-    groups = []  # List of duplicate groups
-    processed = set()  # IDs already assigned to a group
-    
-    for i, item1 in enumerate(data):
-        if item1['id'] in processed:
-            continue
-            
-        # Start a new group with this item
-        group = [item1]
-        processed.add(item1['id'])
+    # Tokenize every entry once (same normalization as calculate_similarity)
+    token_sets = [
+        frozenset(f"{item.get('title', '')} {item.get('content', '')}".lower().split())
+        for item in data
+    ]
+    
+    # Inverted index: token -> positions of entries containing it.
+    # Entries that share no token have similarity 0, so only entries found
+    # through the postings of an entry's tokens need to be compared.
+    postings = defaultdict(list)
+    for idx, tokens in enumerate(token_sets):
+        for token in tokens:
+            postings[token].append(idx)
+    
+    # Union-find over every pair that passes the threshold, so grouping is
+    # transitive: A~B and B~C land in one group even when A and C differ more.
+    parent = list(range(len(data)))
+    
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]  # Path halving
+            x = parent[x]
+        return x
+    
+    def union(a, b):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            # Lower position stays the root so a group is led by its first entry
+            if root_b < root_a:
+                root_a, root_b = root_b, root_a
+            parent[root_b] = root_a
+    
+    # Jaccard can't exceed min(|A|,|B|) / max(|A|,|B|), so entries whose sizes
+    # differ too much are skipped before any counting. The small slack keeps
+    # exact-threshold pairs (e.g. 7 of 10 tokens at 0.7) despite float rounding.
+    sizes = [len(tokens) for tokens in token_sets]
+    
+    for i, tokens1 in enumerate(token_sets):
+        size1 = sizes[i]
+        min_size = threshold * size1 - 1e-9
+        max_size = size1 / threshold + 1e-9 if threshold > 0 else float('inf')
         
-        # Compare with all subsequent items
-        for item2 in data[i+1:]:
-            if item2['id'] in processed:
-                continue
-            
-            # Calculate similarity
-            text1 = f"{item1.get('title', '')} {item1.get('content', '')}"
-            text2 = f"{item2.get('title', '')} {item2.get('content', '')}"
-            
-            similarity = calculate_similarity(text1, text2)
-            
-            if similarity >= threshold:
-                group.append(item2)
-                processed.add(item2['id'])
+        # Count shared tokens with each subsequent item of comparable size
+        overlap = Counter()
+        for token in tokens1:
+            for j in postings[token]:
+                if j > i and min_size <= sizes[j] <= max_size:
+                    overlap[j] += 1
         
-        # Only keep groups with 2+ items
-        if len(group) > 1:
-            groups.append(group)
-    
-    return groups
+        for j, intersection in overlap.items():
+            union_size = size1 + sizes[j] - intersection
+            if intersection / union_size >= threshold:
+                union(i, j)
+    
+    # Bucket by root; insertion order keeps groups and their members in fetch order
+    members = defaultdict(list)
+    for idx, item in enumerate(data):
+        members[find(idx)].append(item)
+    
+    # Only keep groups with 2+ items
+    return [group for group in members.values() if len(group) > 1]
 
 def display_groups(groups):
     """Display duplicate groups for review."""
@@ -115,6 +149,7 @@ def cleanup_duplicates(groups, dry_run=True):
         print(f"\n🗑️ Deleting {total_to_delete} duplicate entries...\n")
     
     deleted_count = 0
+    pending = []  # Items to delete, sent in batches below
     
     for i, group in enumerate(groups, 1):
         # Keep the first (oldest) entry, delete the rest
@@ -127,12 +162,18 @@ def cleanup_duplicates(groups, dry_run=True):
             if dry_run:
                 print(f"  [DRY RUN] Would delete: {item['id']} - {item['title']}")
             else:
-                try:
-                    supabase.table("knowledge_base").delete().eq("id", item['id']).execute()
-                    print(f"  ✅ Deleted: {item['id']} - {item['title']}")
-                    deleted_count += 1
-                except Exception as e:
-                    print(f"  ❌ Failed to delete {item['id']}: {e}")
+                pending.append(item)
+    
+    # One DELETE ... WHERE id IN (...) per batch instead of one request per row
+    for start in range(0, len(pending), DELETE_BATCH_SIZE):
+        batch = pending[start:start + DELETE_BATCH_SIZE]
+        try:
+            supabase.table("knowledge_base").delete().in_("id", [item['id'] for item in batch]).execute()
+            for item in batch:
+                print(f"  ✅ Deleted: {item['id']} - {item['title']}")
+            deleted_count += len(batch)
+        except Exception as e:
+            print(f"  ❌ Failed to delete {', '.join(item['id'] for item in batch)}: {e}")
     
     if not dry_run:
         print(f"\n✨ Cleanup complete! Deleted {deleted_count} entries.")
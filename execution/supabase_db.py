@@ -1,5 +1,11 @@
 import os
+import time
 import uuid
+import atexit
+import threading
+import httpx
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
@@ -13,6 +19,40 @@ if not url or not key:
 
 supabase: Client = create_client(url or "https://placeholder.supabase.co", key or "placeholder")
 
+# pg_trgm similarity above which a new note title counts as a duplicate
+DUPLICATE_TITLE_THRESHOLD = 0.8
+
+# Flipped off after the first failed call if find_similar_note() isn't deployed
+_similar_note_rpc_available = True
+
+# Same for kb_categories()
+_kb_categories_rpc_available = True
+
+# Retries for idempotent reads whose connection dropped or timed out, e.g.
+# when the pooler recycles sockets during a burst of dashboard loads
+READ_RETRIES = 2
+READ_RETRY_BACKOFF = 0.2  # seconds, doubled on each attempt
+
+def execute_read(query, retries=READ_RETRIES):
+    """
+    Execute a read-only query, retrying transient transport errors.
+    
+    Only use this for SELECTs: a write whose response was lost may already
+    have been applied.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return query.execute()
+        except httpx.TransportError:
+            if attempt == retries:
+                raise
+            time.sleep(READ_RETRY_BACKOFF * 2 ** attempt)
+
+def is_missing_rpc_error(e):
+    """True if PostgREST rejected an RPC because the function doesn't exist."""
+    # PGRST202: function not found in the schema cache (HTTP 404)
+    return getattr(e, 'code', None) == "PGRST202" or "PGRST202" in str(e)
+
 def parse_supabase_error(e):
     """Parse common Supabase/PostgREST errors and return a user-friendly message or code."""
     error_str = str(e)
@@ -46,33 +86,48 @@ def get_task_by_name_partial(name_query):
         .execute()
     return response.data
 
+def get_task_id_by_name_partial(name_query):
+    """Return the ID of the newest task whose name matches, or None."""
+    response = supabase.table("tasks") \
+        .select("id") \
+        .ilike("name", f"%{name_query}%") \
+        .order("created_at", desc=True) \
+        .limit(1) \
+        .execute()
+    return response.data[0]['id'] if response.data else None
+
+def contains_filter(column, term):
+    """
+    Build a PostgREST `column ILIKE '%term%'` filter for use inside or_().
+    
+    LIKE wildcards in the term are escaped so they match literally, and the
+    pattern is double-quoted so commas or parentheses in user input can't
+    break the or_() filter syntax.
+    """
+    term = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    pattern = f"%{term}%".replace('\\', '\\\\').replace('"', '\\"')
+    return f'{column}.ilike."{pattern}"'
+
 def search_knowledge(query):
     """Search for keywords across knowledge_base, goals, and business tables."""
-    results = {}
-    
-    # Simple search using ilike on multiple tables
-    # Knowledge Base
-    kb_res = supabase.table("knowledge_base") \
-        .select("*") \
-        .or_(f"title.ilike.%{query}%,content.ilike.%{query}%") \
-        .limit(5).execute()
-    results['knowledge'] = kb_res.data
-    
-    # Goals
-    goal_res = supabase.table("goals") \
-        .select("*") \
-        .or_(f"name.ilike.%{query}%,description.ilike.%{query}%") \
-        .limit(5).execute()
-    results['goals'] = goal_res.data
-    
-    # Business
-    bus_res = supabase.table("business_portfolio") \
-        .select("*") \
-        .or_(f"name.ilike.%{query}%,description.ilike.%{query}%") \
-        .limit(5).execute()
-    results['business'] = bus_res.data
-    
-    return results
+    # Simple search using ilike on multiple tables. The three queries are
+    # independent, so run them concurrently: latency is max-of-three, not sum.
+    def run_search(table, columns):
+        return supabase.table(table) \
+            .select("*") \
+            .or_(",".join(contains_filter(col, query) for col in columns)) \
+            .limit(5).execute().data
+    
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        kb_future = executor.submit(run_search, "knowledge_base", ("title", "content"))
+        goal_future = executor.submit(run_search, "goals", ("name", "description"))
+        bus_future = executor.submit(run_search, "business_portfolio", ("name", "description"))
+        
+        return {
+            'knowledge': kb_future.result(),
+            'goals': goal_future.result(),
+            'business': bus_future.result(),
+        }
 
 def create_goal(goal_data):
     """Insert a new goal into Supabase."""
@@ -83,6 +138,66 @@ def create_goal(goal_data):
     response = supabase.table("goals").insert(goal_data).execute()
     return response.data[0] if response.data else None
 
+def find_similar_note(title, threshold=DUPLICATE_TITLE_THRESHOLD):
+    """
+    Find an existing knowledge item whose title is close to `title`.
+    
+    Uses the pg_trgm `find_similar_note` RPC so the comparison runs in Postgres
+    against the trigram index. Falls back to an ilike + substring check when the
+    function hasn't been created yet (see supabase_schema.sql).
+    
+    Returns:
+        Dict with 'id' and 'title' of the best match, or None
+    """
+    global _similar_note_rpc_available
+    
+    if _similar_note_rpc_available:
+        try:
+            response = supabase.rpc("find_similar_note", {"q": title, "thresh": threshold}).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            # Only a missing function disables the RPC for good; anything
+            # else (timeout, dropped connection, 5xx) falls back just this once
+            if is_missing_rpc_error(e):
+                _similar_note_rpc_available = False
+            print(f"⚠️ find_similar_note RPC failed, using ilike check: {e}")
+    
+    # Search for entries with same or very similar title
+    existing = supabase.table("knowledge_base") \
+        .select("id, title") \
+        .ilike("title", f"%{title}%") \
+        .limit(5) \
+        .execute()
+    
+    for item in existing.data:
+        existing_title = (item.get('title') or '').strip()
+        if existing_title and title.lower() in existing_title.lower():
+            return item
+    return None
+
+def get_kb_categories():
+    """
+    Return the sorted, distinct knowledge base categories.
+    
+    Uses the kb_categories() RPC (see supabase_schema.sql) so Postgres does the
+    DISTINCT; falls back to reading every row's category if the call fails.
+    """
+    global _kb_categories_rpc_available
+    
+    if _kb_categories_rpc_available:
+        try:
+            response = execute_read(supabase.rpc("kb_categories"))
+            return [row['category'] for row in response.data]
+        except Exception as e:
+            # Only a missing function disables the RPC for good; other
+            # failures fall back to the scan for this call only
+            if is_missing_rpc_error(e):
+                _kb_categories_rpc_available = False
+            print(f"⚠️ kb_categories RPC failed, scanning categories: {e}")
+    
+    all_cats = execute_read(supabase.table("knowledge_base").select("category"))
+    return sorted(set(item['category'] for item in all_cats.data if item.get('category')))
+
 def store_knowledge(data):
     """
     Store knowledge item (note, lesson, etc.) into Supabase.
@@ -100,24 +215,14 @@ def store_knowledge(data):
     
     if title:
         try:
-            # Search for entries with same or very similar title
-            existing = supabase.table("knowledge_base") \
-                .select("*") \
-                .ilike("title", f"%{title}%") \
-                .limit(5) \
-                .execute()
-            
-            # Check if any result is close enough to be considered a duplicate
-            for item in existing.data:
-                existing_title = (item.get('title') or '').strip()
-                # If titles are very similar (>80% match), consider it a duplicate
-                if existing_title and title.lower() in existing_title.lower():
-                    return {
-                        'duplicate_found': True,
-                        'existing_id': item['id'],
-                        'existing_title': item['title'],
-                        'suggestion': 'update_existing'
-                    }
+            match = find_similar_note(title)
+            if match:
+                return {
+                    'duplicate_found': True,
+                    'existing_id': match['id'],
+                    'existing_title': match['title'],
+                    'suggestion': 'update_existing'
+                }
         except Exception as e:
             # If similarity check fails, proceed with insert
             print(f"⚠️ Similarity check failed: {e}")
@@ -163,26 +268,79 @@ def update_goal(goal_id, update_data):
 
 # --- Chat History / Memory ---
 
+# Chat messages are buffered and written with one insert per flush. A flush
+# happens when the buffer fills, CHAT_FLUSH_INTERVAL seconds after the first
+# queued message, before any history read, and at interpreter exit.
+CHAT_FLUSH_SIZE = 50
+CHAT_FLUSH_INTERVAL = 0.5  # seconds
+
+_chat_buffer = []
+_chat_lock = threading.Lock()        # Guards _chat_buffer and _chat_flush_timer
+_chat_flush_lock = threading.Lock()  # One insert at a time so batches land in order
+_chat_flush_timer = None
+
 def save_chat_message(user_id, role, message, intent=None):
-    """Save a message to the chat history table."""
+    """
+    Queue a message for the chat history table.
+    
+    created_at is stamped here rather than by the database so messages keep
+    their real order even when several are inserted in the same statement.
+    """
+    global _chat_flush_timer
     data = {
         "user_id": user_id,
         "role": role,
         "message": message,
-        "intent": intent
+        "intent": intent,
+        "created_at": datetime.now(timezone.utc).isoformat()
     }
-    supabase.table("chat_history").insert(data).execute()
+    with _chat_lock:
+        _chat_buffer.append(data)
+        flush_now = len(_chat_buffer) >= CHAT_FLUSH_SIZE
+        if not flush_now and _chat_flush_timer is None:
+            _chat_flush_timer = threading.Timer(CHAT_FLUSH_INTERVAL, flush_chat_messages)
+            _chat_flush_timer.daemon = True
+            _chat_flush_timer.start()
+    
+    if flush_now:
+        flush_chat_messages()
+
+def flush_chat_messages():
+    """Write all buffered chat messages in a single insert."""
+    global _chat_flush_timer
+    with _chat_flush_lock:
+        with _chat_lock:
+            batch = _chat_buffer[:]
+            _chat_buffer.clear()
+            if _chat_flush_timer is not None:
+                _chat_flush_timer.cancel()
+                _chat_flush_timer = None
+        
+        if not batch:
+            return
+        try:
+            supabase.table("chat_history").insert(batch).execute()
+        except Exception as e:
+            print(f"⚠️ Could not save {len(batch)} chat message(s): {e}")
+
+atexit.register(flush_chat_messages)
 
 def get_chat_history(user_id, limit=10):
     """Retrieve the most recent messages for a user."""
-    response = supabase.table("chat_history") \
-        .select("*") \
-        .eq("user_id", user_id) \
-        .order("created_at", desc=True) \
-        .limit(limit) \
-        .execute()
-    # Reverse to get chronological order for the LLM
-    return list(reversed(response.data)) if response.data else []
+    # Make sure messages saved moments ago are visible to this read
+    flush_chat_messages()
+    
+    response = execute_read(
+        supabase.table("chat_history")
+        .select("*")
+        .eq("user_id", user_id)
+        .order("created_at", desc=True)
+        .limit(limit)
+    )
+    # Reverse in place to get chronological order for the LLM
+    messages = response.data or []
+    messages.reverse()
+    return messages
 
 def delete_goal(goal_id):
     """Delete a goal and its associated tasks (managed by CASCADE)."""
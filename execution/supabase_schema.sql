@@ -125,3 +125,39 @@ CREATE TABLE IF NOT EXISTS history_logs (
     details JSONB DEFAULT '{}'::jsonb,
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
+
+-- Trigram title lookup used by store_knowledge() for duplicate detection
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_kb_title_trgm ON knowledge_base USING gin (title gin_trgm_ops);
+
+-- `%` lets the GIN index prefilter (pg_trgm default threshold 0.3); thresh must be >= that
+CREATE OR REPLACE FUNCTION find_similar_note(q TEXT, thresh FLOAT DEFAULT 0.8)
+RETURNS TABLE (id TEXT, title TEXT) AS $$
+    SELECT kb.id, kb.title
+    FROM knowledge_base kb
+    WHERE kb.title % q
+      AND similarity(kb.title, q) > thresh
+    ORDER BY similarity(kb.title, q) DESC
+    LIMIT 1;
+$$ LANGUAGE sql STABLE;
+
+-- Distinct KB categories for the dashboard filter; only the handful of
+-- category names cross the wire instead of one row per entry
+CREATE INDEX IF NOT EXISTS idx_kb_category ON knowledge_base (category);
+
+CREATE OR REPLACE FUNCTION kb_categories()
+RETURNS TABLE (category TEXT) AS $$
+    SELECT DISTINCT kb.category
+    FROM knowledge_base kb
+    WHERE kb.category IS NOT NULL AND kb.category <> ''
+    ORDER BY 1;
+$$ LANGUAGE sql STABLE;
+
+-- Postgres doesn't index foreign keys on its own; backs the dashboard's
+-- tasks-by-goal load (goal_id IN (...) ORDER BY created_at) and CASCADE deletes
+CREATE INDEX IF NOT EXISTS idx_tasks_goal_id ON tasks (goal_id, created_at);
+
+-- Dashboard KB search is a substring match (title/content ILIKE '%q%').
+-- Trigram GIN indexes serve that directly, and unlike a tsvector they also
+-- match inside Thai text, which has no spaces between words
+CREATE INDEX IF NOT EXISTS idx_kb_content_trgm ON knowledge_base USING gin (content gin_trgm_ops);
@@ -0,0 +1,24 @@
+"""
+Gunicorn settings for the NOVA II web service (see render.yaml).
+
+Run with: gunicorn -c gunicorn.conf.py interface.app:app
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# One worker on purpose: message dedup, the intent cache, recent chat history
+# and the chat write buffer live in process memory. Threads share them; extra
+# workers would each keep their own copy and could process a retry twice.
+workers = 1
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+# LLM calls can be slow, but webhook work runs on the message pool; this
+# mostly covers the dashboard's synchronous chat endpoint
+timeout = 180
+keepalive = 5
+
+# No preload_app: interface.app starts threads at import (log listener,
+# message pool), and threads don't survive the fork into the worker.
@@ -1,29 +1,60 @@
 import os
 import sys
 import logging
+import atexit
+import queue
 import json
 import threading
 import time
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import requests
+from requests.adapters import HTTPAdapter
 from flask import Flask, request, abort, jsonify
+from flask.json.provider import DefaultJSONProvider
 from linebot import LineBotApi, WebhookHandler
-from linebot.exceptions import InvalidSignatureError
+from linebot.exceptions import InvalidSignatureError, LineBotApiError
+from linebot.http_client import RequestsHttpClient, RequestsHttpResponse
 from linebot.models import (
     MessageEvent, TextMessage, TextSendMessage,
 )
 from dotenv import load_dotenv
 
+# Faster JSON for API responses (falls back to Flask's stdlib provider)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Load environment variables
 load_dotenv()
 
 # Add project root to sys.path to ensure execution modules are found
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Placeholder for LLMClient (will be imported lazily)
-LLMClient = None
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson.
+    
+    Dates still go through Flask's default() so they serialize exactly as
+    before (HTTP date strings), and sort_keys is honoured.
+    """
+    
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 # Initialize Flask App
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'nova-ii-dev-secret-key-change-me')
 app.permanent_session_lifetime = 86400  # 24 hours
 
@@ -31,39 +62,101 @@ app.permanent_session_lifetime = 86400  # 24 hours
 from interface.dashboard_routes import dashboard
 app.register_blueprint(dashboard)
 
+# Message handling shared with the dashboard chat
+from interface.commands import canned_reply, process_command
+
+# Message worker threads (LLM + DB work runs off the webhook thread)
+MESSAGE_WORKERS = int(os.getenv('NOVA_WORKERS', '8'))
+
+class SessionHttpClient(RequestsHttpClient):
+    """
+    LINE SDK HTTP client backed by one pooled requests.Session.
+    
+    The stock RequestsHttpClient calls requests.post() etc. directly, which
+    opens a new TCP/TLS connection for every reply/push.
+    """
+    
+    def __init__(self, timeout=RequestsHttpClient.DEFAULT_TIMEOUT):
+        super().__init__(timeout)
+        self.session = requests.Session()
+        # Enough connections for every message worker to reply at once
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=MESSAGE_WORKERS))
+    
+    def _request(self, method, url, timeout=None, **kwargs):
+        response = self.session.request(
+            method, url, timeout=self.timeout if timeout is None else timeout, **kwargs
+        )
+        return RequestsHttpResponse(response)
+    
+    def get(self, url, headers=None, params=None, stream=False, timeout=None):
+        return self._request('GET', url, timeout, headers=headers, params=params, stream=stream)
+    
+    def post(self, url, headers=None, data=None, timeout=None):
+        return self._request('POST', url, timeout, headers=headers, data=data)
+    
+    def delete(self, url, headers=None, data=None, timeout=None):
+        return self._request('DELETE', url, timeout, headers=headers, data=data)
+    
+    def put(self, url, headers=None, data=None, timeout=None):
+        return self._request('PUT', url, timeout, headers=headers, data=data)
+
 # Initialize LINE API
 channel_access_token = os.getenv('LINE_CHANNEL_ACCESS_TOKEN')
 channel_secret = os.getenv('LINE_CHANNEL_SECRET')
-line_bot_api = LineBotApi(channel_access_token or 'dummy')
+line_bot_api = LineBotApi(channel_access_token or 'dummy', http_client=SessionHttpClient)
 handler = WebhookHandler(channel_secret or 'dummy')
 
-# Logging
-logging.basicConfig(level=logging.INFO)
+# Logging: request threads only enqueue records; one listener thread does
+# the formatting and the (blocking) stderr writes
+log_queue = queue.SimpleQueue()
+_log_output = logging.StreamHandler()
+_log_output.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+log_listener = QueueListener(log_queue, _log_output)
+log_listener.start()
+atexit.register(log_listener.stop)  # drains queued records on shutdown
+_log_enqueue = QueueHandler(log_queue)
+_log_enqueue.setFormatter(logging.Formatter('%(message)s'))  # level/name prefix added by _log_output
+logging.basicConfig(level=logging.INFO, handlers=[_log_enqueue])
 logger = logging.getLogger(__name__)
+# The LINE SDK's own request logging adds nothing at INFO
+logging.getLogger('linebot').setLevel(logging.WARNING)
 
-# Message De-duplication Cache
-processed_message_ids = set()
-cache_lock = threading.Lock()
-
-# Warmup Thread
-def warmup_modules():
-    """Import heavy modules in background to speed up first request."""
-    logger.info("🧵 Background warmup started...")
-    try:
-        import pandas
-        import openai
-        import anthropic
-        from execution.llm_utils import LLMClient
-        from execution.supabase_db import get_active_goals
-        logger.info("✅ Background warmup complete.")
-    except Exception as e:
-        logger.warning(f"⚠️ Warmup partially failed: {e}")
+# Worker pool for message processing; bounded, so a burst of webhooks queues
+# up instead of starting a thread per message
+message_executor = ThreadPoolExecutor(max_workers=MESSAGE_WORKERS, thread_name_prefix='nova-msg')
 
-# Start warmup
-threading.Thread(target=warmup_modules, daemon=True).start()
+class BoundedSet:
+    """Set that forgets its oldest entries once it holds more than `cap` items."""
+    
+    def __init__(self, cap):
+        self.cap = cap
+        self._items = OrderedDict()
+    
+    def __contains__(self, item):
+        return item in self._items
+    
+    def __len__(self):
+        return len(self._items)
+    
+    def add(self, item):
+        self._items[item] = None
+        self._items.move_to_end(item)
+        if len(self._items) > self.cap:
+            self._items.popitem(last=False)
+
+# Reply tokens are only valid for about a minute after the webhook arrives;
+# past this age, replies go straight to the push API
+REPLY_TOKEN_MAX_AGE = 55  # seconds
+
+# Message De-duplication Cache (most recent IDs, oldest evicted first)
+processed_message_ids = BoundedSet(2048)
+cache_lock = threading.Lock()
 
-# Store User ID (Simple file-based storage for MVP)
-USER_ID_FILE = 'user_ids.json'
+# Store User ID (Simple file-based storage for MVP): append-only, one ID per line
+USER_ID_FILE = 'user_ids.txt'
+LEGACY_USER_ID_FILE = 'user_ids.json'  # Old JSON list format, read once at startup
+known_user_ids = set()
+user_id_lock = threading.Lock()
 
 @app.route("/")
 def index():
@@ -74,27 +167,52 @@ def health():
     """Explicit health check for Render."""
     return jsonify({"status": "healthy", "timestamp": str(datetime.now())}), 200
 
+def load_user_ids():
+    """Load known User IDs once at startup, folding in the legacy JSON file."""
+    try:
+        if os.path.exists(USER_ID_FILE):
+            with open(USER_ID_FILE, 'r') as f:
+                known_user_ids.update(line.strip() for line in f if line.strip())
+        
+        if os.path.exists(LEGACY_USER_ID_FILE):
+            with open(LEGACY_USER_ID_FILE, 'r') as f:
+                missing = set(json.load(f)) - known_user_ids
+            if missing:
+                with open(USER_ID_FILE, 'a') as f:
+                    f.writelines(uid + '\n' for uid in sorted(missing))
+                known_user_ids.update(missing)
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️ Could not load saved user IDs: {e}")
+
+load_user_ids()
+
 def save_user_id(user_id):
-    """Save User ID for push messages."""
-    users = set()
-    if os.path.exists(USER_ID_FILE):
+    """Save User ID for push messages (one appended line per new user)."""
+    if user_id in known_user_ids:
+        return
+    
+    with user_id_lock:
+        if user_id in known_user_ids:
+            return
         try:
-            with open(USER_ID_FILE, 'r') as f:
-                users = set(json.load(f))
-        except:
-            pass
+            # A single short O_APPEND write can't interleave with other writers
+            with open(USER_ID_FILE, 'a') as f:
+                f.write(user_id + '\n')
+        except OSError as e:
+            logger.warning(f"⚠️ Could not save user ID: {e}")
+            return
+        known_user_ids.add(user_id)
     
-    if user_id not in users:
-        users.add(user_id)
-        with open(USER_ID_FILE, 'w') as f:
-            json.dump(list(users), f)
-        print(f"Saved new user ID: {user_id}")
+    print(f"Saved new user ID: {user_id}")
 
 @app.route("/callback", methods=['POST'])
 def callback():
     signature = request.headers.get('X-Line-Signature')
+    if not signature:
+        # Unsigned requests can never validate; don't read or parse the body
+        abort(400)
     body = request.get_data(as_text=True)
-    app.logger.info("Request body: " + body)
+    app.logger.debug("Request body: %s", body)
 
     try:
         handler.handle(body, signature)
@@ -108,308 +226,65 @@ def handle_message(event):
     message_id = event.message.id
     user_id = event.source.user_id
     reply_token = event.reply_token
+    received_at = time.monotonic()
     user_message = event.message.text.strip()
     
     # 1. Check for duplicates (De-duplication)
     with cache_lock:
         if message_id in processed_message_ids:
-            logger.info(f"⏭️ Skipping duplicate message: {message_id}")
+            logger.info("⏭️ Skipping duplicate message: %s", message_id)
             return
         processed_message_ids.add(message_id)
-        # Keep cache size manageable (last 500 IDs)
-        if len(processed_message_ids) > 500:
-            processed_message_ids.pop()
     
     # 2. Save User ID
     save_user_id(user_id)
     
-    # 3. Process in Background Thread
+    # 3. Canned replies are answered right here; no worker or LLM needed
+    canned = canned_reply(user_message.lower())
+    if canned is not None:
+        try:
+            send_reply(reply_token, user_id, canned)
+        except Exception as e:
+            logger.error(f"❌ Could not send canned reply: {e}")
+        return
+    
+    # 4. Process in Background Worker
     def async_process():
         try:
-            logger.info(f"🧵 Processing message {message_id} in background...")
+            logger.info("🧵 Processing message %s in background...", message_id)
             reply_text = process_command(user_message, user_id)
             
-            line_bot_api.reply_message(
-                reply_token,
-                TextSendMessage(text=reply_text)
-            )
-            logger.info(f"✅ Background processing complete for {message_id}")
+            send_reply(reply_token, user_id, reply_text, received_at)
+            logger.info("✅ Background processing complete for %s", message_id)
         except Exception as e:
             logger.error(f"❌ Error in async_process: {e}")
             try:
-                line_bot_api.reply_message(
-                    reply_token,
-                    TextSendMessage(text="ขออภัยค่ะ โนว่าประมวลผลผิดพลาด รบกวนลองอีกครั้งนะคะ")
-                )
+                send_reply(reply_token, user_id, "ขออภัยค่ะ โนว่าประมวลผลผิดพลาด รบกวนลองอีกครั้งนะคะ", received_at)
             except:
                 pass
 
-    threading.Thread(target=async_process, daemon=True).start()
-    logger.info(f"🚀 Started background thread for {message_id}. Returning 200 OK...")
-
-def process_command(message, user_id):
-    """Process message using LLM to determine intent."""
-    global LLMClient
-    
-    # Lazy Imports
-    from execution.supabase_db import (
-        save_chat_message, get_chat_history, delete_goal, 
-        search_knowledge, store_knowledge, update_knowledge, delete_task, update_task, get_task_by_name_partial,
-        parse_supabase_error
-    )
-    from execution.llm_utils import LLMClient as ActualLLMClient
-    from execution.goal_create import create_goal, breakdown_existing_goal
-    
-    if message.lower() == 'ping':
-        return 'pong! NOVA II is online.'
-        
-    start_time = time.time()
-    reply_text = "ขออภัยค่ะ โนว่าประมวลผลผิดพลาด"
-    intent = "CHAT"
-    
+    message_executor.submit(async_process)
+    logger.info("🚀 Queued message %s for background processing. Returning 200 OK...", message_id)
+
+def send_reply(reply_token, user_id, text, received_at=None):
+    """Reply via the reply token, falling back to a push message if LINE rejects the token (e.g. expired)."""
+    message = TextSendMessage(text=text)
+    if received_at is not None and time.monotonic() - received_at > REPLY_TOKEN_MAX_AGE:
+        # Token has (almost) expired; skip the reply call that would fail anyway
+        logger.info("⌛ Reply token too old, sending push message")
+        line_bot_api.push_message(user_id, message)
+        return
     try:
-        logger.info(f"🤖 Starting AI Processing for message: {message[:20]}...")
-        client = ActualLLMClient()
-        
-        # 0. Save User Message immediately for context (Fail-safe)
-        try:
-            save_chat_message(user_id, "user", message)
-        except Exception as e:
-            app.logger.warning(f"Could not save user message to history: {e}")
-        
-        # 0.1 Fetch Chat History
-        history = []
-        try:
-            history = get_chat_history(user_id, limit=6)
-        except Exception as e:
-            app.logger.warning(f"Could not fetch chat history: {e}")
-            
-        history_str = "\n".join([f"{m['role']}: {m['message']}" for m in history])
-
-        # 1. Intent Classification
-        system_prompt = f"""
-        You are NOVA II, Ben's personal AI Assistant. Your mission is to be his "Second Brain".
-        You help Ben manage knowledge, track goals, and optimize his business/life.
-        
-        YOUR CORE PHILOSOPHY:
-        - Be proactive: If Ben shares a fact, ask if he wants to save it.
-        - Be reasoning-oriented: Don't just list data, evaluate it if asked.
-        - Be conversational: Use friendly Thai (Female tone: use 'ค่ะ/คะ') or English.
-        - Be knowledgeable: You have access to Supabase tables: 'knowledge_base', 'goals', 'tasks', and 'business_portfolio'.
-        
-        RECENT CONTEXT:
-        {history_str}
-        
-        Available Intents:
-        - CREATE_GOAL: User wants to create a new goal.
-          Params: name, description, due_date (YYYY-MM-DD), response (a helpful Thai reply to clarify missing info)
-          Note: This only creates the record. You MUST ask if they want a task breakdown afterwards.
-          
-        - CONFIRM_TASKS: User confirms they want the action plan/tasks for the LAST goal created.
-          Params: goal_id (optional)
-          
-        - VIEW_GOALS: User wants to see their goals.
-          Params: none
-          
-        - DAILY_BRIEF: User asks what to do today, this week, or their status.
-          Params: none
-          
-        - SEARCH_KNOWLEDGE: User asks for information, facts, or looks up something.
-          Params: query (search keywords)
-          
-        - STORE_NOTE: User explicitly wants to save information, lesson, or note.
-          Params: title, content, category (Notes, Lessons, Business, Customers, Other)
-          
-        - UPDATE_NOTE: User wants to UPDATE/EDIT existing note content or consolidate information.
-          Params: item_id (e.g., NOTE-123), title (optional), content (optional), category (optional)
-          
-        - UPDATE_KNOWLEDGE: User wants to update a knowledge entry (specifically category).
-          Params: item_id (e.g., NOTE-123), category (Notes, Lessons, Business, Customers, Other)
-          
-        - DELETE_GOAL: User wants to delete a goal.
-          Params: goal_id or name
-          
-        - UPDATE_TASK: User wants to change task status.
-          Params: task_id or task_name, status
-
-        - VIEW_CALENDAR: User asks about schedule, what's coming up, calendar events.
-          Examples: "วันนี้มีอะไรบ้าง", "ตารางสัปดาห์นี้", "upcoming events"
-          Params: days (default 7, number of days ahead to look)
-          
-        - CREATE_EVENT: User wants to schedule/create a calendar event.
-          Examples: "จอง meeting พรุ่งนี้ บ่าย 2", "add event..."
-          Params: summary (event title), date (YYYY-MM-DD or 'วันนี้'/'พรุ่งนี้'), start_time (HH:MM), end_time (HH:MM), description (optional), location (optional)
-          
-        - DELETE_EVENT: User wants to cancel/remove a calendar event.
-          Examples: "ยกเลิกนัด meeting", "cancel the ABC event"
-          Params: event_name (search query to find the event)
-          
-        - CHAT: General conversation.
-          Params: response (your helpful reply)
-        """
-        
-        response = client.generate_json(
-            f"User Message: {message}\nCurrent Date: {datetime.now().strftime('%Y-%m-%d')}",
-            system_prompt=system_prompt
-        )
-        
-        if not response:
-            return "Sorry, I couldn't process that request."
-            
-        intent = response.get('intent')
-        params = response.get('params', {})
-        
-        # 2. Routing Logic
-        if intent == 'CREATE_GOAL':
-            name = params.get('name')
-            desc = params.get('description', '')
-            due = params.get('due_date')
-            if not name:
-                reply_text = params.get('response') or "ยินดีช่วยตั้งเป้าหมายค่ะ! อยากให้เป้าหมายนี้ชื่อว่าอะไรดีคะ?"
-            else:
-                result = create_goal(name, description=desc, due_date=due, auto_breakdown=False)
-                if result.get('success'):
-                    reply_text = f"✅ บันทึกเป้าหมาย '{name}' เรียบร้อยแล้วค่ะ!\n\n📅 กำหนดส่ง: {due or 'ไม่ระบุ'}\n\n**อยากให้โนว่าช่วยแตกเป็นรายการงานย่อย (Tasks) ให้เลยไหมคะ?**\n\n🎯 ดูทั้งหมด: https://nova-ii.onrender.com/dashboard"
-                else:
-                    reply_text = f"❌ เกิดข้อผิดพลาดในการสร้างเป้าหมายค่ะ: {result.get('error')}"
-            
-        elif intent == 'CONFIRM_TASKS':
-            from execution.goal_utils import get_active_goals
-            goals = get_active_goals()
-            if not goals:
-                reply_text = "🔍 ไม่พบเป้าหมายล่าสุดค่ะ"
-            else:
-                last_goal = goals[0]
-                result = breakdown_existing_goal(last_goal['id'])
-                if result.get('success'):
-                    reply_text = f"✨ โนว่าแตกงานย่อยให้ '{last_goal['name']}' เรียบร้อยแล้วค่ะ! {result.get('tasks_count')} รายการ\n\n📋 ดูความคืบหน้า: https://nova-ii.onrender.com/dashboard"
-                else:
-                    reply_text = f"❌ ไม่สามารถแตกงานได้ค่ะ: {result.get('error')}"
-
-        elif intent == 'UPDATE_KNOWLEDGE':
-            item_id = params.get('item_id')
-            new_cat = params.get('category')
-            if not item_id or not new_cat:
-                reply_text = "❌ รบกวนระบุรหัสโน้ตและหมวดหมู่ด้วยนะคะ"
-            else:
-                result = update_knowledge(item_id, {"category": new_cat})
-                reply_text = f"✅ อัปเดตโน้ต '{item_id}' เป็นหมวด '{new_cat}' แล้วค่ะ!\n\n📝 ดูโน้ต: https://nova-ii.onrender.com/dashboard" if result else f"❌ ไม่พบโน้ตรหัส '{item_id}' ค่ะ"
-        
-        elif intent == 'SEARCH_KNOWLEDGE':
-            query = params.get('query')
-            if not query:
-                reply_text = "จะให้ค้นหาอะไรดีคะ?"
-            else:
-                search_results = search_knowledge(query)
-                reply_text = f"🔍 ผลการค้นหาสำหรับ '{query}':\n"
-                # ... Simplified search response for brevty in overwrite ...
-                found = False
-                if search_results.get('knowledge'):
-                    found = True
-                    for k in search_results['knowledge']: reply_text += f"\n- {k['title']}"
-                if not found: reply_text = f"❌ ไม่พบข้อมูลสำหรับ '{query}' ค่ะ"
-
-        elif intent == 'STORE_NOTE':
-            note_data = {"title": params.get('title', "Note"), "content": params.get('content'), "category": params.get('category', 'Notes')}
-            result = store_knowledge(note_data)
-            
-            # Handle duplicate detection
-            if result and result.get('duplicate_found'):
-                existing_id = result.get('existing_id')
-                existing_title = result.get('existing_title')
-                reply_text = f"⚠️ พบโน้ตที่คล้ายกันอยู่แล้วค่ะ:\n\n📝 {existing_title} (ID: {existing_id})\n\nอยากให้อัปเดตโน้ตเดิมหรือสร้างใหม่อยู่ดีคะ?"
-            elif result:
-                reply_text = f"✅ บันทึกเรียบร้อยแล้วค่ะ! (ID: {result.get('id')})\n\n📝 ดูทั้งหมด: https://nova-ii.onrender.com/dashboard"
-            else:
-                reply_text = "❌ บันทึกไม่สำเร็จค่ะ"
-        
-        elif intent == 'UPDATE_NOTE':
-            item_id = params.get('item_id')
-            update_data = {}
-            if params.get('title'): update_data['title'] = params['title']
-            if params.get('content'): update_data['content'] = params['content']
-            if params.get('category'): update_data['category'] = params['category']
-            
-            if not item_id:
-                reply_text = "❌ รบกวนระบุรหัสโน้ตที่ต้องการแก้ไขด้วยนะคะ"
-            else:
-                result = update_knowledge(item_id, update_data)
-                reply_text = f"✅ อัปเดตโน้ต '{item_id}' เรียบร้อยแล้วค่ะ!\n\n📝 ดูโน้ต: https://nova-ii.onrender.com/dashboard" if result else f"❌ ไม่พบโน้ตรหัส '{item_id}' ค่ะ"
-
-        elif intent == 'VIEW_GOALS':
-            from execution.goal_utils import get_active_goals
-            goals = get_active_goals()
-            reply_text = f"เป้าหมายตอนนี้ ({len(goals)}):\n" + "\n".join([f"📌 {g['id']}: {g['name']}" for g in goals]) if goals else "🔍 ไม่พบเป้าหมายค่ะ"
-
-        elif intent == 'UPDATE_TASK':
-            task_id = params.get('task_id')
-            new_status = params.get('status', 'Done')
-            result = update_task(task_id, {"status": new_status})
-            reply_text = f"✅ อัปเดตงาน '{task_id}' เป็น '{new_status}' แล้วค่ะ" if result else "❌ อัปเดตไม่สำเร็จค่ะ"
-
-        elif intent == 'VIEW_CALENDAR':
-            from execution.google_calendar import list_events, format_events_thai
-            days = int(params.get('days', 7))
-            events = list_events(days=days)
-            reply_text = format_events_thai(events)
-
-        elif intent == 'CREATE_EVENT':
-            from execution.google_calendar import create_event, parse_datetime_thai
-            summary = params.get('summary')
-            if not summary:
-                reply_text = "อยากสร้าง event อะไรดีคะ? บอกชื่อ, วันที่, และเวลาได้เลยค่ะ"
-            else:
-                date_str = params.get('date', 'วันนี้')
-                start_str = params.get('start_time', '09:00')
-                end_str = params.get('end_time', '10:00')
-                start_iso = parse_datetime_thai(date_str, start_str)
-                end_iso = parse_datetime_thai(date_str, end_str)
-                result = create_event(
-                    summary=summary,
-                    start_time=start_iso,
-                    end_time=end_iso,
-                    description=params.get('description'),
-                    location=params.get('location')
-                )
-                if result and result.get('success'):
-                    reply_text = f"✅ สร้าง event '{result['summary']}' เรียบร้อยแล้วค่ะ!\n📅 {result['start']} → {result['end']}\n🔗 {result.get('link', '')}"
-                else:
-                    reply_text = "❌ ไม่สามารถสร้าง event ได้ค่ะ กรุณาลองอีกครั้งนะคะ"
-
-        elif intent == 'DELETE_EVENT':
-            from execution.google_calendar import find_event_by_name, delete_event
-            event_name = params.get('event_name', '')
-            if not event_name:
-                reply_text = "❌ รบกวนบอกชื่อ event ที่ต้องการลบด้วยนะคะ"
-            else:
-                matches = find_event_by_name(event_name)
-                if not matches:
-                    reply_text = f"🔍 ไม่พบ event ที่ชื่อ '{event_name}' ค่ะ"
-                else:
-                    # Delete the first match
-                    target = matches[0]
-                    result = delete_event(target['id'])
-                    if result.get('success'):
-                        reply_text = f"✅ ลบ event '{target['summary']}' ({target['start']}) เรียบร้อยแล้วค่ะ"
-                    else:
-                        reply_text = f"❌ ลบ event ไม่สำเร็จค่ะ: {result.get('error')}"
-
-        else: # CHAT
-            reply_text = params.get('response', "รับทราบค่ะ!")
-
-    except Exception as e:
-        logger.error(f"❌ Error in process_command: {e}")
-        err_code, msg = parse_supabase_error(e)
-        reply_text = f"🚨 {msg}" if err_code == "SCHEMA_MISMATCH" else f"ขออภัยค่ะ เกิดข้อผิดพลาด: {msg}"
-             
-    finally:
-        end_time = time.time()
-        logger.info(f"✅ AI Processing complete in {end_time - start_time:.2f}s")
-        try:
-            save_chat_message(user_id, "assistant", reply_text, intent)
-        except:
-            pass
-        return reply_text
+        line_bot_api.reply_message(reply_token, message)
+    except LineBotApiError as e:
+        # Only a rejected token is safe to retry as a push; after a 429/5xx
+        # the reply may still have been delivered, and pushes use up quota
+        if e.status_code == 400 and 'Invalid reply token' in (e.error.message or ''):
+            logger.warning("⚠️ Reply token rejected, sending push message instead")
+            line_bot_api.push_message(user_id, message)
+            return
+        logger.error("❌ Reply failed (%s): %s", e.status_code, e.error.message)
+        raise
 
 if __name__ == "__main__":
     port = int(os.environ.get('PORT', 5000))
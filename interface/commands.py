@@ -0,0 +1,453 @@
+"""
+NOVA II - Command Processing
+
+Turns a chat message into a reply: fixed and fast commands first, then LLM
+intent classification and the intent handlers. Shared by the LINE webhook
+(interface.app) and the dashboard chat (interface.dashboard_routes); it
+imports neither, so both can import it at module level.
+"""
+
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+
+# Intent Classification Cache
+from interface.intent_cache import intent_cache_key, get_cached_intent, cache_intent
+
+# Execution layer, imported once at startup instead of inside every handler
+from execution.supabase_db import (
+    save_chat_message, get_chat_history, parse_supabase_error,
+    search_knowledge, store_knowledge, update_knowledge, update_task, get_task_id_by_name_partial
+)
+from execution.llm_utils import get_llm_client
+from execution.goal_utils import get_active_goals
+from execution.goal_create import create_goal, breakdown_existing_goal
+from execution.google_calendar import (
+    list_events, format_events_thai, create_event, parse_datetime_thai,
+    find_event_by_name, delete_event
+)
+
+# Build the shared LLM client now so the first message doesn't pay for it
+get_llm_client()
+
+logger = logging.getLogger(__name__)
+
+# ─── Fast Commands (answered without an LLM call) ───
+
+DASHBOARD_URL = "https://nova-ii.onrender.com/dashboard"
+
+# Reply templates shared by more than one intent
+NOTE_NOT_FOUND_TEMPLATE = "❌ ไม่พบโน้ตรหัส '{item_id}' ค่ะ"
+
+HELP_TEXT = (
+    "🤖 NOVA II ช่วยอะไรได้บ้างคะ:\n"
+    "🎯 ตั้งเป้าหมาย, ดูเป้าหมาย, อัปเดตสถานะงาน\n"
+    "📝 บันทึกโน้ต, ค้นหาความรู้\n"
+    "📅 ดูตาราง, สร้างหรือยกเลิกนัด\n\n"
+    "พิมพ์บอกโนว่าเป็นประโยคธรรมดาได้เลยค่ะ\n"
+    f"📋 Dashboard: {DASHBOARD_URL}"
+)
+
+def format_goals_reply(goals):
+    """Format active goals as a LINE reply."""
+    if not goals:
+        return "🔍 ไม่พบเป้าหมายค่ะ"
+    return f"เป้าหมายตอนนี้ ({len(goals)}):\n" + "\n".join([f"📌 {g['id']}: {g['name']}" for g in goals])
+
+def reply_view_goals():
+    return format_goals_reply(get_active_goals())
+
+GREETING_REPLY = "สวัสดีค่ะ! วันนี้ให้โนว่าช่วยอะไรดีคะ? 😊"
+
+# Fixed replies that need no I/O at all, so the webhook can answer them
+# directly. Keys are normalized (stripped, lowercased) messages.
+CANNED_REPLIES = {
+    'ping': 'pong! NOVA II is online.',
+    'help': HELP_TEXT,
+    '/help': HELP_TEXT,
+    'ช่วยเหลือ': HELP_TEXT,
+}
+GREETING_RE = re.compile(r'^(hi|hello|hey|สวัสดี(ค่ะ|ครับ|จ้า)?)\s*(nova)?[!.\s]*$')
+
+def canned_reply(command):
+    """Return the fixed reply for a normalized message, or None."""
+    reply = CANNED_REPLIES.get(command)
+    if reply is None and GREETING_RE.match(command):
+        reply = GREETING_REPLY
+    return reply
+
+def reply_view_calendar():
+    return handle_view_calendar({'days': 7}, None)
+
+# Commands that read data but skip the LLM (same key normalization)
+FAST_COMMANDS = {
+    'goals': reply_view_goals,
+    '/goals': reply_view_goals,
+    'view goals': reply_view_goals,
+    'เป้าหมาย': reply_view_goals,
+    'ดูเป้าหมาย': reply_view_goals,
+    'calendar': reply_view_calendar,
+    '/calendar': reply_view_calendar,
+    'ตาราง': reply_view_calendar,
+    'ดูตาราง': reply_view_calendar,
+}
+
+# Patterns for commands with a few phrasings, tried in order after the exact
+# lookup. Anchored at both ends so longer requests still go to the LLM.
+FAST_PATTERNS = [
+    (re.compile(r'^(list|show|view|my)\s+goals?$'), reply_view_goals),
+    (re.compile(r'^((list|show|view|my)\s+(calendar|schedule|events)|ตารางนัด)$'), reply_view_calendar),
+]
+
+def run_fast_command(command):
+    """Answer a deterministic command, or return None to fall through to the LLM."""
+    reply = canned_reply(command)
+    if reply is not None:
+        return reply
+    handler_func = FAST_COMMANDS.get(command)
+    if handler_func is None:
+        for pattern, pattern_handler in FAST_PATTERNS:
+            if pattern.match(command):
+                handler_func = pattern_handler
+                break
+    return handler_func() if handler_func else None
+
+# Intent classification prompt. Kept static and sent before the per-message
+# chat context so providers with automatic prefix caching can reuse it.
+INTENT_SYSTEM_PROMPT = """
+You are NOVA II, Ben's personal AI Assistant. Your mission is to be his "Second Brain".
+You help Ben manage knowledge, track goals, and optimize his business/life.
+
+YOUR CORE PHILOSOPHY:
+- Be proactive: If Ben shares a fact, ask if he wants to save it.
+- Be reasoning-oriented: Don't just list data, evaluate it if asked.
+- Be conversational: Use friendly Thai (Female tone: use 'ค่ะ/คะ') or English.
+- Be knowledgeable: You have access to Supabase tables: 'knowledge_base', 'goals', 'tasks', and 'business_portfolio'.
+
+Available Intents:
+- CREATE_GOAL: User wants to create a new goal.
+  Params: name, description, due_date (YYYY-MM-DD), response (a helpful Thai reply to clarify missing info)
+  Note: This only creates the record. You MUST ask if they want a task breakdown afterwards.
+
+- CONFIRM_TASKS: User confirms they want the action plan/tasks for the LAST goal created.
+  Params: goal_id (optional)
+
+- VIEW_GOALS: User wants to see their goals.
+  Params: none
+
+- DAILY_BRIEF: User asks what to do today, this week, or their status.
+  Params: none
+
+- SEARCH_KNOWLEDGE: User asks for information, facts, or looks up something.
+  Params: query (search keywords)
+
+- STORE_NOTE: User explicitly wants to save information, lesson, or note.
+  Params: title, content, category (Notes, Lessons, Business, Customers, Other)
+
+- UPDATE_NOTE: User wants to UPDATE/EDIT existing note content or consolidate information.
+  Params: item_id (e.g., NOTE-123), title (optional), content (optional), category (optional)
+
+- UPDATE_KNOWLEDGE: User wants to update a knowledge entry (specifically category).
+  Params: item_id (e.g., NOTE-123), category (Notes, Lessons, Business, Customers, Other)
+
+- DELETE_GOAL: User wants to delete a goal.
+  Params: goal_id or name
+
+- UPDATE_TASK: User wants to change task status.
+  Params: task_id or task_name, status
+
+- VIEW_CALENDAR: User asks about schedule, what's coming up, calendar events.
+  Examples: "วันนี้มีอะไรบ้าง", "ตารางสัปดาห์นี้", "upcoming events"
+  Params: days (default 7, number of days ahead to look)
+
+- CREATE_EVENT: User wants to schedule/create a calendar event.
+  Examples: "จอง meeting พรุ่งนี้ บ่าย 2", "add event..."
+  Params: summary (event title), date (YYYY-MM-DD or 'วันนี้'/'พรุ่งนี้'), start_time (HH:MM), end_time (HH:MM), description (optional), location (optional)
+
+- DELETE_EVENT: User wants to cancel/remove a calendar event.
+  Examples: "ยกเลิกนัด meeting", "cancel the ABC event"
+  Params: event_name (search query to find the event)
+
+- CHAT: General conversation.
+  Params: response (your helpful reply)
+"""
+
+# ─── Intent Handlers ───
+# Each takes the LLM params (and user_id) and returns the reply text.
+
+# Asked after every new goal; a plain "yes" to it means CONFIRM_TASKS
+BREAKDOWN_QUESTION = "**อยากให้โนว่าช่วยแตกเป็นรายการงานย่อย (Tasks) ให้เลยไหมคะ?**"
+CONFIRM_REPLIES = frozenset({
+    'yes', 'ok', 'okay', 'sure',
+    'ใช่', 'ใช่ค่ะ', 'ใช่ครับ', 'ตกลง', 'เอา', 'เอาเลย', 'ได้เลย', 'จัดไป',
+})
+
+def is_breakdown_confirmation(normalized, history):
+    """True if the message is a bare yes and the bot's last message asked to break down a goal."""
+    if normalized not in CONFIRM_REPLIES:
+        return False
+    for m in reversed(history):
+        if m['role'] == 'assistant':
+            return BREAKDOWN_QUESTION in m['message']
+    return False
+
+def handle_create_goal(params, user_id):
+    name = params.get('name')
+    desc = params.get('description', '')
+    due = params.get('due_date')
+    if not name:
+        return params.get('response') or "ยินดีช่วยตั้งเป้าหมายค่ะ! อยากให้เป้าหมายนี้ชื่อว่าอะไรดีคะ?"
+    result = create_goal(name, description=desc, due_date=due, auto_breakdown=False)
+    if result.get('success'):
+        return f"✅ บันทึกเป้าหมาย '{name}' เรียบร้อยแล้วค่ะ!\n\n📅 กำหนดส่ง: {due or 'ไม่ระบุ'}\n\n{BREAKDOWN_QUESTION}\n\n🎯 ดูทั้งหมด: {DASHBOARD_URL}"
+    return f"❌ เกิดข้อผิดพลาดในการสร้างเป้าหมายค่ะ: {result.get('error')}"
+
+def handle_confirm_tasks(params, user_id):
+    goals = get_active_goals()
+    if not goals:
+        return "🔍 ไม่พบเป้าหมายล่าสุดค่ะ"
+    last_goal = goals[0]
+    result = breakdown_existing_goal(last_goal['id'])
+    if result.get('success'):
+        return f"✨ โนว่าแตกงานย่อยให้ '{last_goal['name']}' เรียบร้อยแล้วค่ะ! {result.get('tasks_count')} รายการ\n\n📋 ดูความคืบหน้า: {DASHBOARD_URL}"
+    return f"❌ ไม่สามารถแตกงานได้ค่ะ: {result.get('error')}"
+
+def handle_update_knowledge(params, user_id):
+    item_id = params.get('item_id')
+    new_cat = params.get('category')
+    if not item_id or not new_cat:
+        return "❌ รบกวนระบุรหัสโน้ตและหมวดหมู่ด้วยนะคะ"
+    result = update_knowledge(item_id, {"category": new_cat})
+    return f"✅ อัปเดตโน้ต '{item_id}' เป็นหมวด '{new_cat}' แล้วค่ะ!\n\n📝 ดูโน้ต: {DASHBOARD_URL}" if result else NOTE_NOT_FOUND_TEMPLATE.format(item_id=item_id)
+
+def handle_search_knowledge(params, user_id):
+    query = params.get('query')
+    if not query:
+        return "จะให้ค้นหาอะไรดีคะ?"
+    search_results = search_knowledge(query)
+    if not search_results.get('knowledge'):
+        return f"❌ ไม่พบข้อมูลสำหรับ '{query}' ค่ะ"
+    lines = [f"🔍 ผลการค้นหาสำหรับ '{query}':\n"]
+    lines.extend(f"- {k['title']}" for k in search_results['knowledge'])
+    return "\n".join(lines)
+
+def handle_store_note(params, user_id):
+    note_data = {"title": params.get('title', "Note"), "content": params.get('content'), "category": params.get('category', 'Notes')}
+    result = store_knowledge(note_data)
+    
+    # Handle duplicate detection
+    if result and result.get('duplicate_found'):
+        existing_id = result.get('existing_id')
+        existing_title = result.get('existing_title')
+        return f"⚠️ พบโน้ตที่คล้ายกันอยู่แล้วค่ะ:\n\n📝 {existing_title} (ID: {existing_id})\n\nอยากให้อัปเดตโน้ตเดิมหรือสร้างใหม่อยู่ดีคะ?"
+    if result:
+        return f"✅ บันทึกเรียบร้อยแล้วค่ะ! (ID: {result.get('id')})\n\n📝 ดูทั้งหมด: {DASHBOARD_URL}"
+    return "❌ บันทึกไม่สำเร็จค่ะ"
+
+def handle_update_note(params, user_id):
+    item_id = params.get('item_id')
+    update_data = {}
+    if params.get('title'): update_data['title'] = params['title']
+    if params.get('content'): update_data['content'] = params['content']
+    if params.get('category'): update_data['category'] = params['category']
+    
+    if not item_id:
+        return "❌ รบกวนระบุรหัสโน้ตที่ต้องการแก้ไขด้วยนะคะ"
+    result = update_knowledge(item_id, update_data)
+    return f"✅ อัปเดตโน้ต '{item_id}' เรียบร้อยแล้วค่ะ!\n\n📝 ดูโน้ต: {DASHBOARD_URL}" if result else NOTE_NOT_FOUND_TEMPLATE.format(item_id=item_id)
+
+def handle_view_goals(params, user_id):
+    return reply_view_goals()
+
+def handle_update_task(params, user_id):
+    task_id = params.get('task_id')
+    new_status = params.get('status', 'Done')
+    if not task_id and params.get('task_name'):
+        task_id = get_task_id_by_name_partial(params['task_name'])
+        if not task_id:
+            return f"🔍 ไม่พบงานที่ชื่อ '{params['task_name']}' ค่ะ"
+    result = update_task(task_id, {"status": new_status})
+    return f"✅ อัปเดตงาน '{task_id}' เป็น '{new_status}' แล้วค่ะ" if result else "❌ อัปเดตไม่สำเร็จค่ะ"
+
+def handle_view_calendar(params, user_id):
+    days = int(params.get('days', 7))
+    events = list_events(days=days)
+    return format_events_thai(events)
+
+def handle_create_event(params, user_id):
+    summary = params.get('summary')
+    if not summary:
+        return "อยากสร้าง event อะไรดีคะ? บอกชื่อ, วันที่, และเวลาได้เลยค่ะ"
+    date_str = params.get('date', 'วันนี้')
+    start_str = params.get('start_time', '09:00')
+    end_str = params.get('end_time', '10:00')
+    start_iso = parse_datetime_thai(date_str, start_str)
+    end_iso = parse_datetime_thai(date_str, end_str)
+    result = create_event(
+        summary=summary,
+        start_time=start_iso,
+        end_time=end_iso,
+        description=params.get('description'),
+        location=params.get('location')
+    )
+    if result and result.get('success'):
+        return f"✅ สร้าง event '{result['summary']}' เรียบร้อยแล้วค่ะ!\n📅 {result['start']} → {result['end']}\n🔗 {result.get('link', '')}"
+    return "❌ ไม่สามารถสร้าง event ได้ค่ะ กรุณาลองอีกครั้งนะคะ"
+
+def handle_delete_event(params, user_id):
+    event_name = params.get('event_name', '')
+    if not event_name:
+        return "❌ รบกวนบอกชื่อ event ที่ต้องการลบด้วยนะคะ"
+    matches = find_event_by_name(event_name)
+    if not matches:
+        return f"🔍 ไม่พบ event ที่ชื่อ '{event_name}' ค่ะ"
+    # Delete the first match
+    target = matches[0]
+    result = delete_event(target['id'])
+    if result.get('success'):
+        return f"✅ ลบ event '{target['summary']}' ({target['start']}) เรียบร้อยแล้วค่ะ"
+    return f"❌ ลบ event ไม่สำเร็จค่ะ: {result.get('error')}"
+
+def handle_chat(params, user_id):
+    return params.get('response', "รับทราบค่ะ!")
+
+# Intent -> handler; anything not listed (CHAT, or intents without an action
+# yet) falls back to handle_chat and replies with the LLM's response text
+INTENT_HANDLERS = {
+    'CREATE_GOAL': handle_create_goal,
+    'CONFIRM_TASKS': handle_confirm_tasks,
+    'UPDATE_KNOWLEDGE': handle_update_knowledge,
+    'SEARCH_KNOWLEDGE': handle_search_knowledge,
+    'STORE_NOTE': handle_store_note,
+    'UPDATE_NOTE': handle_update_note,
+    'VIEW_GOALS': handle_view_goals,
+    'UPDATE_TASK': handle_update_task,
+    'VIEW_CALENDAR': handle_view_calendar,
+    'CREATE_EVENT': handle_create_event,
+    'DELETE_EVENT': handle_delete_event,
+}
+
+# ─── Recent Chat History (per-user, in memory) ───
+# The bot writes every chat turn itself, so once a user's last few messages
+# have been read from Supabase they can be kept up to date locally instead of
+# re-read on every message.
+HISTORY_LIMIT = 6
+HISTORY_CACHE_USERS = 256
+
+_history_cache = OrderedDict()  # user_id -> deque of {'role', 'message'}, oldest user first
+_history_lock = threading.Lock()
+
+def get_recent_history(user_id):
+    """Return the user's last HISTORY_LIMIT messages, reading Supabase only on a cache miss."""
+    with _history_lock:
+        recent = _history_cache.get(user_id)
+        if recent is not None:
+            _history_cache.move_to_end(user_id)
+            return list(recent)
+    
+    history = get_chat_history(user_id, limit=HISTORY_LIMIT)
+    with _history_lock:
+        # Another worker may have filled it meanwhile; keep theirs
+        if user_id not in _history_cache:
+            _history_cache[user_id] = deque(
+                ({'role': m['role'], 'message': m['message']} for m in history),
+                maxlen=HISTORY_LIMIT
+            )
+            if len(_history_cache) > HISTORY_CACHE_USERS:
+                _history_cache.popitem(last=False)
+    return history
+
+def remember_message(user_id, role, message):
+    """Append a just-saved message to the user's cached history, if cached."""
+    with _history_lock:
+        recent = _history_cache.get(user_id)
+        if recent is not None:
+            recent.append({'role': role, 'message': message})
+
+def process_command(message, user_id):
+    """Process message using LLM to determine intent."""
+    # Normalize once; reused for fast commands and the intent cache key
+    normalized = message.strip().lower()
+    
+    # Deterministic commands skip the LLM entirely
+    fast_reply = run_fast_command(normalized)
+    if fast_reply is not None:
+        return fast_reply
+        
+    start_time = time.time()
+    reply_text = "ขออภัยค่ะ โนว่าประมวลผลผิดพลาด"
+    intent = "CHAT"
+    
+    try:
+        logger.info("🤖 Starting AI Processing for message: %.20s...", message)
+        client = get_llm_client()
+        
+        # 0. Save User Message immediately for context (Fail-safe)
+        try:
+            save_chat_message(user_id, "user", message)
+        except Exception as e:
+            logger.warning(f"Could not save user message to history: {e}")
+        remember_message(user_id, "user", message)
+        
+        # 1. Intent Classification (cached read-only intents don't use chat
+        # context, so history is only fetched when the LLM actually runs)
+        # One date for both the cache key and the prompt, so they can't
+        # disagree across midnight
+        today = datetime.now().strftime('%Y-%m-%d')
+        cache_key = intent_cache_key(normalized, today)
+        response = get_cached_intent(cache_key)
+        if response is not None:
+            logger.info("⚡ Intent cache hit")
+        else:
+            # 1.1 Fetch Chat History
+            history = []
+            try:
+                history = get_recent_history(user_id)
+            except Exception as e:
+                logger.warning(f"Could not fetch chat history: {e}")
+                
+            if is_breakdown_confirmation(normalized, history):
+                # "ใช่" right after the breakdown question needs no LLM
+                response = {'intent': 'CONFIRM_TASKS', 'params': {}}
+            else:
+                # New users and failed history reads get the bare prompt
+                # rather than an empty context block
+                system_prompt = INTENT_SYSTEM_PROMPT
+                if history:
+                    history_str = "\n".join(f"{m['role']}: {m['message']}" for m in history)
+                    system_prompt += f"\nRECENT CONTEXT:\n{history_str}\n"
+                
+                response = client.generate_json(
+                    f"User Message: {message}\nCurrent Date: {today}",
+                    system_prompt=system_prompt
+                )
+                if response:
+                    cache_intent(cache_key, response)
+        
+        if not response:
+            return "Sorry, I couldn't process that request."
+            
+        intent = response.get('intent')
+        params = response.get('params', {})
+        
+        # 2. Routing Logic
+        handler_func = INTENT_HANDLERS.get(intent, handle_chat)
+        reply_text = handler_func(params, user_id)
+
+    except Exception as e:
+        logger.error(f"❌ Error in process_command: {e}")
+        err_code, msg = parse_supabase_error(e)
+        reply_text = f"🚨 {msg}" if err_code == "SCHEMA_MISMATCH" else f"ขออภัยค่ะ เกิดข้อผิดพลาด: {msg}"
+             
+    finally:
+        end_time = time.time()
+        logger.info("✅ AI Processing complete in %.2fs", end_time - start_time)
+        try:
+            save_chat_message(user_id, "assistant", reply_text, intent)
+        except:
+            pass
+        remember_message(user_id, "assistant", reply_text)
+        return reply_text
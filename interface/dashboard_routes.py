@@ -6,12 +6,26 @@ Uses PIN-based authentication stored in session cookies.
 """
 
 import os
+import time
+import threading
 import functools
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from flask import (
     Blueprint, render_template, request, redirect, 
     url_for, session, jsonify, abort
 )
-from datetime import datetime
+from datetime import datetime, date
+
+# Execution layer, imported once per process rather than inside every route
+from execution.supabase_db import (
+    supabase, update_goal, delete_goal, create_tasks, update_task, delete_task,
+    get_chat_history, get_kb_categories, execute_read, contains_filter
+)
+from execution.goal_create import create_goal as logic_create_goal
+from execution.google_calendar import list_events, create_event, delete_event
+from execution.action_logger import log_action, flush_action_logs
+from interface.commands import process_command
 
 dashboard = Blueprint(
     'dashboard', __name__,
@@ -20,6 +34,60 @@ dashboard = Blueprint(
     static_url_path='/dashboard/static'
 )
 
+# Shared pool for running independent Supabase queries of one request in
+# parallel (the client is sync; threads wait on sockets, not the GIL)
+query_executor = ThreadPoolExecutor(max_workers=5, thread_name_prefix='dash-query')
+
+# ─── Response Cache ──────────────────────────────
+# Short-lived cache for slow, rarely-changing reads (stats, KB categories,
+# calendar). Dashboard writes drop the affected entries right away; changes
+# made through LINE show up once the TTL runs out.
+
+API_CACHE_TTL = 30  # seconds
+
+_api_cache = {}  # (name, *args) -> (expires_at, value)
+_api_cache_lock = threading.Lock()
+
+def cached_call(key, fn, ttl=API_CACHE_TTL, cache_empty=True):
+    """
+    Return fn()'s result, reusing it for `ttl` seconds per key.
+    
+    With cache_empty=False an empty result is returned but not stored, for
+    helpers that report failures as an empty list.
+    """
+    now = time.monotonic()
+    with _api_cache_lock:
+        entry = _api_cache.get(key)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+    
+    value = fn()
+    if value or cache_empty:
+        with _api_cache_lock:
+            _api_cache[key] = (now + ttl, value)
+    return value
+
+def invalidate_cache(*names):
+    """Drop cached entries whose key starts with one of `names`."""
+    with _api_cache_lock:
+        for key in [k for k in _api_cache if k[0] in names]:
+            del _api_cache[key]
+
+@dashboard.after_request
+def add_conditional_headers(response):
+    """
+    ETag successful API reads so unchanged data comes back as a bodiless 304.
+
+    `no-cache` makes the browser revalidate on every load instead of trusting
+    a max-age, so dashboard writes are never masked by a stale local copy.
+    """
+    if (request.method == 'GET' and request.path.startswith('/api/')
+            and response.status_code == 200 and response.is_json):
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.add_etag()
+        response.make_conditional(request)
+    return response
+
 # ─── Authentication ──────────────────────────────
 
 def login_required(f):
@@ -63,75 +131,90 @@ def home():
 
 # ─── API Endpoints ───────────────────────────────
 
+def count_rows(table, **filters):
+    """
+    Exact row count without downloading the rows.
+    
+    PostgREST reports the full count in Content-Range regardless of the
+    limit, so limit(1) keeps the body to a single id.
+    """
+    query = supabase.table(table).select("id", count="exact")
+    for column, value in filters.items():
+        query = query.eq(column, value)
+    return execute_read(query.limit(1)).count or 0
+
+def load_stats():
+    """Run the summary queries behind /api/stats."""
+    # The counts are independent, so run them concurrently:
+    # latency is the slowest one, not the sum
+    futures = {
+        'kb_entries': query_executor.submit(count_rows, "knowledge_base"),
+        'active_goals': query_executor.submit(count_rows, "goals", status="Active"),
+        'total_goals': query_executor.submit(count_rows, "goals"),
+        'total_tasks': query_executor.submit(count_rows, "tasks"),
+        'done_tasks': query_executor.submit(count_rows, "tasks", status="Done"),
+    }
+    stats = {name: future.result() for name, future in futures.items()}
+    stats['timestamp'] = datetime.now().isoformat()
+    return stats
+
 @dashboard.route('/api/stats')
 @login_required
 def api_stats():
     """Summary statistics for dashboard cards."""
-    from execution.supabase_db import supabase
-    
     try:
-        # Knowledge Base count
-        kb = supabase.table("knowledge_base").select("id", count="exact").execute()
-        kb_count = kb.count if hasattr(kb, 'count') and kb.count else len(kb.data)
-        
-        # Goals
-        goals_active = supabase.table("goals").select("id", count="exact").eq("status", "Active").execute()
-        active_count = goals_active.count if hasattr(goals_active, 'count') and goals_active.count else len(goals_active.data)
-        
-        goals_all = supabase.table("goals").select("id", count="exact").execute()
-        total_goals = goals_all.count if hasattr(goals_all, 'count') and goals_all.count else len(goals_all.data)
-        
-        # Tasks
-        tasks_all = supabase.table("tasks").select("id, status").execute()
-        total_tasks = len(tasks_all.data)
-        done_tasks = sum(1 for t in tasks_all.data if t.get('status') == 'Done')
-        
-        return jsonify({
-            'success': True,
-            'stats': {
-                'active_goals': active_count,
-                'total_goals': total_goals,
-                'total_tasks': total_tasks,
-                'done_tasks': done_tasks,
-                'kb_entries': kb_count,
-                'timestamp': datetime.now().isoformat()
-            }
-        })
+        return jsonify({'success': True, 'stats': cached_call(('stats',), load_stats)})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Columns the goal cards render; long text fields (description,
+# progress_notes) are served by /api/goals/<goal_id> instead
+GOAL_CARD_FIELDS = "id,name,category,status,priority,due_date,created_at"
+TASK_CARD_FIELDS = "id,goal_id,name,status,due_date"
+
 @dashboard.route('/api/goals')
 @login_required
 def api_goals():
     """Goals with linked tasks."""
-    from execution.supabase_db import supabase
-    
     try:
         # Fetch goals ordered by status (Active first) then due_date
-        goals = supabase.table("goals") \
-            .select("*") \
-            .order("status", desc=False) \
-            .order("due_date", desc=False) \
-            .execute()
+        goals = execute_read(
+            supabase.table("goals")
+            .select(GOAL_CARD_FIELDS)
+            .order("status", desc=False)
+            .order("due_date", desc=False)
+        )
+        
+        # Fetch every goal's tasks in one query and group them here,
+        # instead of one round trip per goal; done counts in the same pass
+        tasks_by_goal = defaultdict(list)
+        done_by_goal = Counter()
+        goal_ids = [goal['id'] for goal in goals.data]
+        if goal_ids:
+            tasks = execute_read(
+                supabase.table("tasks")
+                .select(TASK_CARD_FIELDS)
+                .in_("goal_id", goal_ids)
+                .order("created_at", desc=False)
+            )
+            for task in tasks.data:
+                tasks_by_goal[task['goal_id']].append(task)
+                if task.get('status') == 'Done':
+                    done_by_goal[task['goal_id']] += 1
         
-        # For each goal, fetch tasks
+        today = datetime.now().date()
         result = []
         for goal in goals.data:
-            tasks = supabase.table("tasks") \
-                .select("*") \
-                .eq("goal_id", goal['id']) \
-                .order("created_at", desc=False) \
-                .execute()
-            
-            total = len(tasks.data)
-            done = sum(1 for t in tasks.data if t.get('status') == 'Done')
+            goal_tasks = tasks_by_goal.get(goal['id'], [])
+            total = len(goal_tasks)
+            done = done_by_goal[goal['id']]
             
             # Calculate urgency
             urgency = 'normal'
             if goal.get('due_date'):
                 try:
-                    due = datetime.strptime(goal['due_date'], '%Y-%m-%d').date()
-                    days_left = (due - datetime.now().date()).days
+                    due = date.fromisoformat(goal['due_date'])
+                    days_left = (due - today).days
                     if days_left < 0:
                         urgency = 'overdue'
                     elif days_left <= 3:
@@ -143,7 +226,7 @@ def api_goals():
             
             result.append({
                 **goal,
-                'tasks': tasks.data,
+                'tasks': goal_tasks,
                 'tasks_total': total,
                 'tasks_done': done,
                 'progress': round((done / total * 100) if total > 0 else 0),
@@ -154,12 +237,27 @@ def api_goals():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@dashboard.route('/api/goals/<goal_id>')
+@login_required
+def api_goal_detail(goal_id):
+    """Full goal record, including the long fields left out of the list."""
+    try:
+        response = execute_read(
+            supabase.table("goals")
+            .select("*")
+            .eq("id", goal_id)
+            .limit(1)
+        )
+        if not response.data:
+            return jsonify({'success': False, 'error': 'Goal not found'}), 404
+        return jsonify({'success': True, 'goal': response.data[0]})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @dashboard.route('/api/goals', methods=['POST'])
 @login_required
 def create_goal():
     """Create a new goal."""
-    from execution.goal_create import create_goal as logic_create_goal
-    
     try:
         data = request.get_json()
         name = data.get('name')
@@ -174,36 +272,35 @@ def create_goal():
             priority=data.get('priority', 'Medium'),
             auto_breakdown=data.get('auto_breakdown', False)
         )
+        invalidate_cache('stats')
         return jsonify(result)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Fields the dashboard may change on a goal, and the statuses a task can take
+ALLOWED_GOAL_FIELDS = frozenset({'name', 'description', 'due_date', 'status', 'priority', 'category'})
+VALID_TASK_STATUSES = frozenset({'Todo', 'In Progress', 'Done', 'Cancelled'})
+
 @dashboard.route('/api/goals/<goal_id>', methods=['PUT'])
 @login_required
 def update_goal_api(goal_id):
     """Update an existing goal."""
-    from execution.supabase_db import update_goal
-    
     try:
         data = request.get_json()
         if not data:
             return jsonify({'success': False, 'error': 'No data provided'}), 400
             
         # Filter allowed fields
-        allowed = ['name', 'description', 'due_date', 'status', 'priority', 'category']
-        updates = {k: v for k, v in data.items() if k in allowed}
+        updates = {k: v for k, v in data.items() if k in ALLOWED_GOAL_FIELDS}
         
         if not updates:
             return jsonify({'success': False, 'error': 'No valid fields to update'}), 400
             
         result = update_goal(goal_id, updates)
+        invalidate_cache('stats')
         
         # Log action
-        try:
-            from execution.action_logger import log_action
-            log_action('UPDATE_GOAL', f"Updated goal: {goal_id}", {'id': goal_id, 'updates': updates})
-        except:
-            pass
+        log_action('UPDATE_GOAL', f"Updated goal: {goal_id}", {'id': goal_id, 'updates': updates})
             
         return jsonify({'success': True, 'data': result})
     except Exception as e:
@@ -213,17 +310,12 @@ def update_goal_api(goal_id):
 @login_required
 def delete_goal_api(goal_id):
     """Delete a goal and its tasks."""
-    from execution.supabase_db import delete_goal
-    
     try:
         result = delete_goal(goal_id)
+        invalidate_cache('stats')
         
         # Log action
-        try:
-            from execution.action_logger import log_action
-            log_action('DELETE_GOAL', f"Deleted goal: {goal_id}", {'id': goal_id})
-        except:
-            pass
+        log_action('DELETE_GOAL', f"Deleted goal: {goal_id}", {'id': goal_id})
             
         return jsonify({'success': True, 'data': result})
     except Exception as e:
@@ -235,8 +327,6 @@ def delete_goal_api(goal_id):
 @login_required
 def create_task_api():
     """Add a new task to a goal."""
-    from execution.supabase_db import create_tasks
-    
     try:
         data = request.get_json()
         goal_id = data.get('goal_id')
@@ -253,13 +343,10 @@ def create_task_api():
         }]
         
         result = create_tasks(task_data)
+        invalidate_cache('stats')
         
         # Log action
-        try:
-            from execution.action_logger import log_action
-            log_action('CREATE_TASK', f"Created task: {name}", {'goal_id': goal_id, 'name': name})
-        except:
-            pass
+        log_action('CREATE_TASK', f"Created task: {name}", {'goal_id': goal_id, 'name': name})
             
         return jsonify({'success': True, 'data': result})
     except Exception as e:
@@ -269,26 +356,20 @@ def create_task_api():
 @login_required
 def update_task_api(task_id):
     """Update task status or details."""
-    from execution.supabase_db import update_task
-    
     try:
         data = request.get_json()
         if not data:
             return jsonify({'success': False, 'error': 'No data provided'}), 400
             
-        valid_statuses = ['Todo', 'In Progress', 'Done', 'Cancelled']
-        if 'status' in data and data['status'] not in valid_statuses:
+        if 'status' in data and data['status'] not in VALID_TASK_STATUSES:
              return jsonify({'success': False, 'error': 'Invalid status'}), 400
              
         result = update_task(task_id, data)
+        invalidate_cache('stats')
         
         # Log action
-        try:
-            from execution.action_logger import log_action
-            action_type = 'COMPLETE_TASK' if data.get('status') == 'Done' else 'UPDATE_TASK'
-            log_action(action_type, f"Updated task {task_id}", {'id': task_id, 'updates': data})
-        except:
-            pass
+        action_type = 'COMPLETE_TASK' if data.get('status') == 'Done' else 'UPDATE_TASK'
+        log_action(action_type, f"Updated task {task_id}", {'id': task_id, 'updates': data})
 
         return jsonify({'success': True, 'data': result})
     except Exception as e:
@@ -298,31 +379,33 @@ def update_task_api(task_id):
 @login_required
 def delete_task_api(task_id):
     """Delete a task."""
-    from execution.supabase_db import delete_task
-    
     try:
         result = delete_task(task_id)
+        invalidate_cache('stats')
         
         # Log action
-        try:
-            from execution.action_logger import log_action
-            log_action('DELETE_TASK', f"Deleted task {task_id}", {'id': task_id})
-        except:
-            pass
+        log_action('DELETE_TASK', f"Deleted task {task_id}", {'id': task_id})
             
         return jsonify({'success': True, 'data': result})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Shorter terms have no complete trigram, so the KB trigram indexes can't
+# narrow them down and the search would read the whole table
+KB_MIN_SEARCH_LENGTH = 3
+
 @dashboard.route('/api/kb')
 @login_required
 def api_kb():
     """Knowledge base entries with optional category filter."""
-    from execution.supabase_db import supabase
-    
     try:
         category = request.args.get('category')
-        search = request.args.get('search')
+        search = (request.args.get('search') or '').strip()
+        if search and len(search) < KB_MIN_SEARCH_LENGTH:
+            return jsonify({
+                'success': False,
+                'error': f'Search needs at least {KB_MIN_SEARCH_LENGTH} characters'
+            }), 400
         
         query = supabase.table("knowledge_base") \
             .select("*") \
@@ -332,13 +415,12 @@ def api_kb():
             query = query.eq("category", category)
         
         if search:
-            query = query.or_(f"title.ilike.%{search}%,content.ilike.%{search}%")
+            query = query.or_(f"{contains_filter('title', search)},{contains_filter('content', search)}")
         
-        result = query.limit(50).execute()
+        result = execute_read(query.limit(50))
         
-        # Get unique categories for filter
-        all_cats = supabase.table("knowledge_base").select("category").execute()
-        categories = sorted(set(item['category'] for item in all_cats.data if item.get('category')))
+        # Unique categories for the filter
+        categories = cached_call(('kb_categories',), get_kb_categories)
         
         return jsonify({
             'success': True, 
@@ -354,8 +436,6 @@ def api_kb():
 @login_required
 def api_chat():
     """Send a message to NOVA and get a response."""
-    from interface.app import process_command
-    
     data = request.get_json()
     if not data:
         return jsonify({'success': False, 'error': 'Invalid JSON'}), 400
@@ -367,6 +447,8 @@ def api_chat():
     try:
         user_id = 'dashboard-user'
         reply = process_command(message, user_id)
+        # A chat command may have changed anything the cache holds
+        invalidate_cache('stats', 'kb_categories', 'calendar')
         return jsonify({
             'success': True,
             'reply': reply,
@@ -379,8 +461,6 @@ def api_chat():
 @login_required
 def api_chat_history():
     """Load chat history for dashboard user."""
-    from execution.supabase_db import get_chat_history
-    
     try:
         messages = get_chat_history('dashboard-user', limit=50)
         return jsonify({'success': True, 'messages': messages})
@@ -389,14 +469,19 @@ def api_chat_history():
 
 # ─── Calendar API Endpoint ───────────────────────
 
+# Upper bound for ?days=, which is also part of the cache key
+CALENDAR_MAX_DAYS = 90
+
 @dashboard.route('/api/calendar', methods=['GET'])
 @login_required
 def api_calendar_list():
     """Get upcoming calendar events (Manual fetch)."""
-    from execution.google_calendar import list_events
     try:
-        days = int(request.args.get('days', 7))
-        events = list_events(days=days)
+        days = min(max(int(request.args.get('days', 7)), 1), CALENDAR_MAX_DAYS)
+        # list_events() returns [] on Google API errors, so an empty
+        # result is never cached
+        events = cached_call(('calendar', days), lambda: list_events(days=days),
+                             cache_empty=False)
         return jsonify({'success': True, 'events': events})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -405,9 +490,6 @@ def api_calendar_list():
 @login_required
 def api_calendar_create():
     """Create a new calendar event."""
-    from execution.google_calendar import create_event
-    from execution.action_logger import log_action
-    
     try:
         data = request.get_json()
         summary = data.get('summary')
@@ -424,6 +506,7 @@ def api_calendar_create():
         result = create_event(summary, start_iso, end_iso, 
                             description=data.get('description'),
                             location=data.get('location'))
+        invalidate_cache('calendar')
                             
         if result and result.get('success'):
             log_action('CREATE_EVENT', f"Created event: {summary}", result)
@@ -437,14 +520,12 @@ def api_calendar_create():
 @login_required
 def api_calendar_delete(event_id):
     """Delete a calendar event."""
-    from execution.google_calendar import delete_event
-    from execution.action_logger import log_action
-    
     try:
         # Optional: Fetch event details before delete if we want the name, 
         # but for now logging ID is acceptable or we rely on client sending name?
         # Let's just log ID.
         result = delete_event(event_id)
+        invalidate_cache('calendar')
         if result.get('success'):
             log_action('DELETE_EVENT', f"Deleted event ID: {event_id}", {'id': event_id})
         return jsonify(result)
@@ -455,13 +536,15 @@ def api_calendar_delete(event_id):
 @login_required
 def api_history():
     """Get recent history logs."""
-    from execution.supabase_db import supabase
     try:
-        response = supabase.table("history_logs") \
-            .select("*") \
-            .order("created_at", desc=True) \
-            .limit(20) \
-            .execute()
+        # Make sure actions logged moments ago are in the list
+        flush_action_logs()
+        response = execute_read(
+            supabase.table("history_logs")
+            .select("*")
+            .order("created_at", desc=True)
+            .limit(20)
+        )
         return jsonify({'success': True, 'logs': response.data})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
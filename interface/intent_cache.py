@@ -0,0 +1,54 @@
+"""
+NOVA II - Intent Classification Cache
+
+Exact-match TTL cache for LLM intent classifications, so repeated messages
+("ดูเป้าหมาย", "search pricing") skip the LLM round trip.
+
+Keys are a hash of the normalized message plus today's date (the prompt
+includes the current date), so raw user text is never stored as a key.
+"""
+
+import hashlib
+import threading
+import time
+from datetime import datetime
+
+CACHE_TTL = 300  # seconds
+CACHE_MAX = 1024
+
+# Only read-only intents whose params come from the message itself. Anything
+# that depends on chat context (CONFIRM_TASKS, CHAT) or writes data is always
+# re-classified by the LLM.
+CACHEABLE_INTENTS = {'VIEW_GOALS', 'DAILY_BRIEF', 'SEARCH_KNOWLEDGE', 'VIEW_CALENDAR'}
+
+_entries = {}  # key -> (expires_at, response)
+_lock = threading.Lock()
+
+def intent_cache_key(normalized_message, today=None):
+    """Build the cache key for an already stripped/lowercased message."""
+    if today is None:
+        today = datetime.now().strftime('%Y-%m-%d')
+    raw = f"{today}\n{normalized_message}".encode('utf-8')
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+def get_cached_intent(key):
+    """Return a cached classification, or None if missing/expired."""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        expires_at, response = entry
+        if expires_at < time.monotonic():
+            del _entries[key]
+            return None
+        return response
+
+def cache_intent(key, response):
+    """Cache a classification if its intent is safe to reuse."""
+    if response.get('intent') not in CACHEABLE_INTENTS:
+        return
+    with _lock:
+        if len(_entries) >= CACHE_MAX:
+            # Evict the oldest entry (dicts keep insertion order)
+            _entries.pop(next(iter(_entries)))
+        _entries[key] = (time.monotonic() + CACHE_TTL, response)